@@ -23,15 +23,49 @@ Usage:
 Environment (.env):
   ZTB_API_BASE=https://<tenant>-api.goairgap.com
   BEARER=<raw-token>
+  ZTB_JINJA_CACHE=<dir>   (optional; compiled-template cache, default ~/.cache/ztb-jinja)
+  ZTB_HTTP2=1             (optional; send API calls over HTTP/2 via httpx[http2])
 """
 
-import os, sys, csv, json, time, ipaddress, argparse, pathlib, subprocess, re
-from typing import Any, Dict, List, Tuple, Optional, Iterable, Set
+import os, sys, csv, json, time, random, ipaddress, argparse, pathlib, re, functools, itertools, threading, queue, atexit, logging, logging.handlers
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Tuple, Optional, Iterable, Iterator, Set, Union
 import requests
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
 import zpa_provisioning
 import ztb_login
 
+# Optional: orjson for faster JSON encode/decode (falls back to stdlib json)
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+# Optional: httpx for HTTP/2 (opt-in via ZTB_HTTP2=1; requests stays the default)
+try:
+    import httpx  # type: ignore
+except ImportError:
+    httpx = None
+
+# Site/VLAN workers log concurrently: they only enqueue records, one listener thread writes stdout
+log = logging.getLogger("bulk_create")
+_LOG_QUEUE: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+_log_out = logging.StreamHandler(sys.stdout)
+_log_out.setFormatter(logging.Formatter("%(message)s"))
+_LOG_LISTENER = logging.handlers.QueueListener(_LOG_QUEUE, _log_out)
+log.addHandler(logging.handlers.QueueHandler(_LOG_QUEUE))
+log.setLevel(logging.INFO)
+log.propagate = False
+_LOG_LISTENER.start()
+atexit.register(_LOG_LISTENER.stop)
+
+def _flush_log() -> None:
+    # ztb_login / zpa_provisioning print to stdout directly: drain the queue first so their
+    # output lands after this site's earlier log lines (the listener task_done()s each record)
+    _LOG_QUEUE.join()
+
 # ------------------------
 # tiny .env loader (OVERWRITES existing env vars)
 # ------------------------
@@ -55,15 +89,36 @@ def load_env_file(path: str = ".env"):
 load_env_file(".env")
 
 DEBUG = False
+# --refresh-templates: refetch the template list once when a template_name misses
+REFRESH_TEMPLATES = False
 
-# Short, sensible polling defaults
+# Short, sensible polling defaults (exponential backoff with full jitter)
 POLL_RETRIES = 12
-POLL_DELAY_S = 2.0
-
-# Paths needed early (for ztb_login.py)
+POLL_BASE_DELAY_S = 0.5
+POLL_MAX_DELAY_S = 8.0
+# Wall-clock cap on one site's gateway/cluster poll, whatever the retry count
+POLL_TOTAL_BUDGET_S = 120.0
+# Upper bound on waiting for a new site's site_id to show up in the gateway list
+SITE_ID_MAX_WAIT_S = 30.0
+
+# Parallel per-VLAN API calls per site (--max-parallel)
+VLAN_WORKERS = 8
+# Sites processed in parallel by main() (--concurrency). Sequential by default: per-site
+# log lines (and zpa_provisioning / ztb_login output) carry no site name, so parallel
+# sites interleave; raise it when throughput matters more than readable output.
+SITE_WORKERS = 1
+
+# Rows per search-filtered gateway list GET
+GATEWAY_PAGE_LIMIT = 100
+
+# Connection pool sizing (all calls go to one ZTB host)
+HTTP_POOL_CONNECTIONS = 4
+# maxsize covers every site worker running a full VLAN fan-out at once (main() re-sizes it for the flags)
+HTTP_POOL_MAXSIZE = SITE_WORKERS * VLAN_WORKERS
+
+# Paths needed early
 ROOT = pathlib.Path(__file__).resolve().parent
 TEMPLATE_PATH = ROOT / "site_template.json.j2"
-LOGIN_SCRIPT = ROOT / "ztb_login.py"
 
 # -------- auth helpers --------
 def _normalize_base_root(raw: str) -> str:
@@ -72,40 +127,64 @@ def _normalize_base_root(raw: str) -> str:
         base = base.rsplit("/api/", 1)[0]
     return base
 
+def _login_in_process() -> Optional[str]:
+    # ztb_login is imported above; call it directly instead of spawning a new interpreter
+    _flush_log()
+    try:
+        token, _ = ztb_login.ztb_login(write_env=True, quiet=False)
+    except SystemExit as e:
+        print(f"ERROR: ztb_login failed: {e}", file=sys.stderr)
+        return None
+    return (token or "").strip() or None
+
 def _ensure_bearer_present_or_login():
     bearer = (os.environ.get("BEARER") or "").strip()
     if bearer:
         return
-    if not LOGIN_SCRIPT.exists():
-        print("ERROR: BEARER not set and ztb_login.py not found. Please run login manually.", file=sys.stderr)
-        sys.exit(1)
-    print("🔐 BEARER missing — invoking ztb_login.py to obtain a fresh token…")
-    try:
-        subprocess.run([sys.executable, str(LOGIN_SCRIPT)], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"ERROR: ztb_login.py failed with exit code {e.returncode}", file=sys.stderr)
+    log.info("🔐 BEARER missing — invoking ztb_login to obtain a fresh token…")
+    new_bearer = _login_in_process()
+    if not new_bearer:
         sys.exit(1)
-    load_env_file(".env")  # overwrite back into process
+    os.environ["BEARER"] = new_bearer
+
+# Single-flight token refresh: concurrent 401s share one login
+_REFRESH_LOCK = threading.Lock()
+_LAST_REFRESH_TS = float("-inf")
+REFRESH_DEDUP_S = 5.0
 
 def _refresh_bearer_and_update_session(session: requests.Session) -> bool:
-    if not LOGIN_SCRIPT.exists():
-        print("ERROR: Cannot refresh token automatically (ztb_login.py not found).", file=sys.stderr)
-        return False
-    print("🔄 401 Unauthorized — refreshing token via ztb_login.py and retrying once…")
-    try:
-        subprocess.run([sys.executable, str(LOGIN_SCRIPT)], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"ERROR: ztb_login.py failed with exit code {e.returncode}", file=sys.stderr)
-        return False
-    load_env_file(".env")
-    new_bearer = (os.environ.get("BEARER") or "").strip()
-    if not new_bearer:
-        print("ERROR: ztb_login.py ran but BEARER is still empty.", file=sys.stderr)
-        return False
-    session.headers["Authorization"] = f"Bearer {new_bearer}"
-    return True
+    global _LAST_REFRESH_TS
+    with _REFRESH_LOCK:
+        if time.monotonic() - _LAST_REFRESH_TS < REFRESH_DEDUP_S:
+            return True  # another thread just refreshed
+        log.info("🔄 401 Unauthorized — refreshing token via ztb_login and retrying once…")
+        new_bearer = _login_in_process()
+        if not new_bearer:
+            return False
+        os.environ["BEARER"] = new_bearer
+        session.headers["Authorization"] = f"Bearer {new_bearer}"
+        _LAST_REFRESH_TS = time.monotonic()
+        return True
 
 # -------- env / session --------
+def _mount_pool(s: requests.Session, maxsize: int) -> None:
+    # Keep-alive pool + transient-error retries (429/5xx) at the urllib3 layer, GETs only:
+    # deploy_site / VLAN creates are not idempotent, so a gateway error after commit must not re-send them.
+    # raise_on_status=False hands the last response back so callers still see the status code.
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=maxsize,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+        ),
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+
 def get_sessions_and_bases() -> Tuple[requests.Session, str, str, str, str]:
     base_env = os.environ.get("ZTB_API_BASE") or os.environ.get("ZIA_API_BASE") or ""
     base_root = _normalize_base_root(base_env)
@@ -116,7 +195,7 @@ def get_sessions_and_bases() -> Tuple[requests.Session, str, str, str, str]:
     _ensure_bearer_present_or_login()
     bearer = (os.environ.get("BEARER") or "").strip()
     if not bearer:
-        print("ERROR: BEARER still missing after ztb_login.py.", file=sys.stderr)
+        print("ERROR: BEARER still missing after ztb_login.", file=sys.stderr)
         sys.exit(1)
 
     base_v3 = f"{base_root}/api/v3"
@@ -126,39 +205,135 @@ def get_sessions_and_bases() -> Tuple[requests.Session, str, str, str, str]:
     referer = origin_host + "/"
 
     s = requests.Session()
+    # Headers every ZTB call shares live on the session once; call sites pass only their deltas
     s.headers.update({
         "Authorization": f"Bearer {bearer}",
-        "Accept": "application/json",
+        "Accept": "application/json, text/plain, */*",
+        "Origin": origin_host,
+        "Referer": referer,
         "Content-Type": "application/json",
         "User-Agent": "bulk_create.py",
     })
+    _mount_pool(s, HTTP_POOL_MAXSIZE)
     return s, base_v3, base_v2, origin_host, referer
 
 session, API_V3, API_V2, ORIGIN, REFERER = get_sessions_and_bases()
 
+def _http2_client() -> Optional["httpx.Client"]:
+    if (os.getenv("ZTB_HTTP2") or "").strip() != "1":
+        return None
+    if httpx is None:
+        log.warning("⚠️  ZTB_HTTP2=1 but httpx is not installed; using requests (HTTP/1.1)")
+        return None
+    try:
+        # One connection, multiplexed streams; transport retries cover connects, _send_http2 the statuses
+        # http2/limits must live on the transport: httpx.Client ignores them when transport= is given
+        return httpx.Client(
+            transport=httpx.HTTPTransport(
+                http2=True,
+                retries=3,
+                limits=httpx.Limits(max_connections=HTTP_POOL_CONNECTIONS, max_keepalive_connections=HTTP_POOL_CONNECTIONS),
+            ),
+            timeout=60,
+        )
+    except ImportError:
+        log.warning("⚠️  ZTB_HTTP2=1 but the h2 package is missing (pip install 'httpx[http2]'); using requests")
+        return None
+
+HTTP2_CLIENT = _http2_client()
+if HTTP2_CLIENT is not None:
+    atexit.register(HTTP2_CLIENT.close)
+# Fixed endpoint URLs, built once at import
+_REFRESH_QS = "?refresh_token=enabled"
+_V2_NETWORK_LIST_URL = f"{API_V2}/Network/"
+_V2_NETWORK_CREATE_URL = _V2_NETWORK_LIST_URL + _REFRESH_QS
+_V3_TEMPLATES_PREFIX = f"{API_V3}/templates/"
+
 # -------- utils --------
-def read_csv_rows(p: pathlib.Path) -> List[Dict[str, str]]:
+def iter_csv_rows(p: pathlib.Path) -> Iterator[Dict[str, str]]:
+    # Lazily yields rows; the file is closed once the generator is exhausted or dropped
     with open(p, newline="", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
+        yield from csv.DictReader(f)
 
-def render_template(ctx: Dict[str, Any]) -> str:
+def _jinja_bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+    # Compiled template bytecode persists across runs (ZTB_JINJA_CACHE overrides the dir);
+    # an unwritable location just means compiling from source as before
+    cache_dir = pathlib.Path(os.getenv("ZTB_JINJA_CACHE") or pathlib.Path.home() / ".cache" / "ztb-jinja")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        return None
+    return FileSystemBytecodeCache(str(cache_dir))
+
+@functools.lru_cache(maxsize=1)
+def _site_template():
+    # Built once per run: the .j2 file is read and compiled on first use only
     env = Environment(
         loader=FileSystemLoader(str(ROOT)),
-        autoescape=select_autoescape(enabled_extensions=("j2",))
+        autoescape=select_autoescape(enabled_extensions=("j2",)),
+        cache_size=50,
+        bytecode_cache=_jinja_bytecode_cache(),
     )
-    tmpl = env.get_template(TEMPLATE_PATH.name)
-    return tmpl.render(**ctx)
+    return env.get_template(TEMPLATE_PATH.name)
+
+def render_template(ctx: Dict[str, Any]) -> str:
+    return _site_template().render(**ctx)
+
+def _backoff_sleep(attempt: int, base: float = POLL_BASE_DELAY_S, cap: float = POLL_MAX_DELAY_S) -> None:
+    # full jitter: uniform(0, min(cap, base * 2^attempt))
+    time.sleep(random.uniform(0, min(cap, base * (2 ** attempt))))
+
+def _map_concurrently(fn, items: List[Any], max_workers: Optional[int] = None) -> List[Any]:
+    """Run fn over items from a thread pool sharing the pooled session; results keep input order."""
+    if not items:
+        return []
+    # VLAN_WORKERS is read at call time so --max-parallel applies
+    workers = max(1, min(max_workers or VLAN_WORKERS, HTTP_POOL_MAXSIZE, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(fn, items))
 
 def _d(method: str, url: str, status: int):
     if DEBUG:
-        print(f"* {method} {url}\n  -> {status}")
+        log.debug(f"* {method} {url}\n  -> {status}")
+
+# requests on the default path, httpx with ZTB_HTTP2=1; callers only use the shared surface
+# (status_code, text, content, headers, json())
+_Response = Union[requests.Response, "httpx.Response"]
+
+# Same policy as the requests adapter (_mount_pool): GETs only, 429/502/503/504 and transport errors
+HTTP2_RETRIES = 3
+HTTP2_RETRY_STATUSES = frozenset({429, 502, 503, 504})
+HTTP2_BACKOFF_S = 0.3
+
+def _send_http2(method: str, url: str, **kw) -> "httpx.Response":
+    for attempt in range(HTTP2_RETRIES + 1):
+        last = method != "GET" or attempt == HTTP2_RETRIES
+        try:
+            r = HTTP2_CLIENT.request(method, url, **kw)
+        except httpx.TransportError:
+            if last:
+                raise
+            delay = HTTP2_BACKOFF_S * (2 ** attempt)
+        else:
+            if last or r.status_code not in HTTP2_RETRY_STATUSES:
+                return r
+            ra = (r.headers.get("Retry-After") or "").strip()
+            delay = float(ra) if ra.isdigit() else HTTP2_BACKOFF_S * (2 ** attempt)
+        time.sleep(delay)
 
 # Central request wrapper with 401 refresh
-def _request_with_auto_refresh(method: str, url: str, *, params=None, headers=None, timeout=60, json=None, data=None) -> requests.Response:
-    r = session.request(method, url, params=params, headers=headers, timeout=timeout, json=json, data=data)
+def _send(method: str, url: str, *, params=None, headers=None, timeout=60, json=None, data=None) -> _Response:
+    if HTTP2_CLIENT is None:
+        return session.request(method, url, params=params, headers=headers, timeout=timeout, json=json, data=data)
+    # session.headers stays the source of truth (a 401 refresh swaps the bearer there)
+    h = {**session.headers, **(headers or {})}
+    return _send_http2(method, url, params=params, headers=h, timeout=timeout, json=json, content=data)
+
+def _request_with_auto_refresh(method: str, url: str, *, params=None, headers=None, timeout=60, json=None, data=None) -> _Response:
+    r = _send(method, url, params=params, headers=headers, timeout=timeout, json=json, data=data)
     if r.status_code == 401:
         if _refresh_bearer_and_update_session(session):
-            r = session.request(method, url, params=params, headers=headers, timeout=timeout, json=json, data=data)
+            r = _send(method, url, params=params, headers=headers, timeout=timeout, json=json, data=data)
     return r
 
 def get_json(url: str, params: Optional[Dict[str, str]] = None, headers: Optional[Dict[str, str]] = None) -> Any:
@@ -167,62 +342,70 @@ def get_json(url: str, params: Optional[Dict[str, str]] = None, headers: Optiona
     if r.status_code != 200:
         raise RuntimeError(f"GET {url} -> {r.status_code}: {r.text[:300]}")
     try:
-        return r.json()
-    except Exception:
+        return _loads(r.content)
+    except ValueError:
         raise ValueError(f"Non-JSON response from {url}: {r.text[:300]}")
 
-def post_raw(url: str, data: str, headers: Optional[Dict[str, str]] = None, timeout: int = 90) -> requests.Response:
+def _dumps(obj: Any) -> Union[str, bytes]:
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj)
+
+def _loads(raw: Union[str, bytes]) -> Any:
+    # accepts response bytes directly; orjson.JSONDecodeError subclasses ValueError
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+def post_raw(url: str, data: Union[str, bytes], headers: Optional[Dict[str, str]] = None, timeout: int = 90) -> _Response:
     r = _request_with_auto_refresh("POST", url, headers=headers, timeout=timeout, data=data)
     _d("POST", url, r.status_code)
     return r
 
-def post_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> requests.Response:
-    return post_raw(url, json.dumps(payload), headers=headers, timeout=90)
+def post_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> _Response:
+    return post_raw(url, _dumps(payload), headers=headers, timeout=90)
 
-def put_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, str]] = None) -> requests.Response:
-    r = _request_with_auto_refresh("PUT", url, params=params, headers=headers, timeout=90, data=json.dumps(payload))
+def put_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, str]] = None) -> _Response:
+    r = _request_with_auto_refresh("PUT", url, params=params, headers=headers, timeout=90, data=_dumps(payload))
     _d("PUT", url, r.status_code)
     return r
 
-def patch_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> requests.Response:
-    r = _request_with_auto_refresh("PATCH", url, headers=headers, timeout=90, data=json.dumps(payload))
+def patch_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> _Response:
+    r = _request_with_auto_refresh("PATCH", url, headers=headers, timeout=90, data=_dumps(payload))
     _d("PATCH", url, r.status_code)
     return r
 
 # ---------- v3 helpers ----------
-def _v3_headers() -> Dict[str, str]:
-    return {
-        "Accept": "application/json, text/plain, */*",
-        "Origin": ORIGIN,
-        "Referer": REFERER,
-        "X-Requested-With": "XMLHttpRequest",
-        "Content-Type": "application/json",
-    }
-
-def get_json_v3_gateway(params: Dict[str, str]) -> Any:
-    headers = _v3_headers()
-    primary = f"{API_V3}/Gateway"
+# Built once per run (ORIGIN/REFERER are fixed); requests merges them per call, never mutate
+# Per-call header overrides on top of the session defaults (Accept/Origin/Referer/Content-Type)
+_V3_HEADERS: Dict[str, str] = {"X-Requested-With": "XMLHttpRequest"}
+_PLAIN_JSON_HEADERS: Dict[str, str] = {"Accept": "application/json"}
+
+# Endpoint -> the URL variant ("Gateway" or "Gateway/") that answered; later calls skip the 404/405 probe
+_V3_SLASH_CACHE: Dict[str, str] = {}
+
+def _get_json_v3_variant(endpoint: str, params: Optional[Dict[str, Any]] = None) -> Any:
+    known = _V3_SLASH_CACHE.get(endpoint)
+    if known is not None:
+        return get_json(f"{API_V3}/{known}", params=params, headers=_V3_HEADERS)
     try:
-        return get_json(primary, params=params, headers=headers)
+        data = get_json(f"{API_V3}/{endpoint}", params=params, headers=_V3_HEADERS)
+        variant = endpoint
     except RuntimeError as e:
-        if "404" in str(e) or "405" in str(e):
-            return get_json(f"{API_V3}/Gateway/", params=params, headers=headers)
-        raise
+        if not ("404" in str(e) or "405" in str(e)):
+            raise
+        data = get_json(f"{API_V3}/{endpoint}/", params=params, headers=_V3_HEADERS)
+        variant = endpoint + "/"
+    _V3_SLASH_CACHE[endpoint] = variant
+    return data
+
+def get_json_v3_gateway(params: Dict[str, str]) -> Any:
+    return _get_json_v3_variant("Gateway", params)
 
 def get_json_v3_detail(path: str) -> Any:
-    return get_json(f"{API_V3}/{path.lstrip('/')}", headers=_v3_headers())
+    return get_json(f"{API_V3}/{path.lstrip('/')}", headers=_V3_HEADERS)
 
 # --- templates list (for name→id resolution) ---
+@functools.lru_cache(maxsize=1)
 def get_json_v3_templates() -> List[Dict[str, Any]]:
-    headers = _v3_headers()
-    base = f"{API_V3}/templates"
-    try:
-        data = get_json(base, headers=headers)
-    except RuntimeError as e:
-        if "404" in str(e) or "405" in str(e):
-            data = get_json(base + "/", headers=headers)
-        else:
-            raise
+    # Cached for the run; callers must not mutate the returned list
+    data = _get_json_v3_variant("templates")
     if isinstance(data, dict):
         if isinstance(data.get("result"), list):
             return data["result"]
@@ -236,26 +419,45 @@ class TemplateResolver:
     def __init__(self):
         self._by_lower_name: Dict[str, List[Dict[str, Any]]] = {}
         self._loaded = False
+        self._lock = threading.Lock()
     def _load(self):
         if self._loaded:
             return
-        items = get_json_v3_templates()
-        for t in items:
-            nm = str(t.get("name","")).strip()
-            if nm:
-                self._by_lower_name.setdefault(nm.lower(), []).append(t)
-        self._loaded = True
+        with self._lock:
+            if self._loaded:
+                return
+            by_name: Dict[str, List[Dict[str, Any]]] = {}
+            for t in get_json_v3_templates():
+                nm = str(t.get("name","")).strip()
+                if nm:
+                    by_name.setdefault(nm.lower(), []).append(t)
+            self._by_lower_name = by_name
+            self._loaded = True
         if DEBUG:
-            print(f"Loaded {sum(len(v) for v in self._by_lower_name.values())} templates")
+            log.debug(f"Loaded {sum(len(v) for v in self._by_lower_name.values())} templates")
+    def refresh(self):
+        with self._lock:
+            get_json_v3_templates.cache_clear()
+            _resolve_template_id.cache_clear()
+            self._loaded = False
+        self._load()
     def resolve(self, name: str) -> Optional[str]:
+        return _resolve_template_id(name.strip().lower())
+    def names(self) -> List[str]:
         self._load()
-        hits = self._by_lower_name.get(name.strip().lower(), [])
-        if len(hits) == 1:
-            return hits[0].get("id")
-        return None
+        return sorted({str(t.get("name", "")).strip() for hits in self._by_lower_name.values() for t in hits})
 
 TEMPLATES = TemplateResolver()
 
+@functools.lru_cache(maxsize=None)
+def _resolve_template_id(name_lower: str) -> Optional[str]:
+    # Rows sharing a template_name resolve once; cleared by TEMPLATES.refresh()
+    TEMPLATES._load()
+    hits = TEMPLATES._by_lower_name.get(name_lower, [])
+    if len(hits) == 1:
+        return hits[0].get("id")
+    return None
+
 def ensure_template_id_for_row(row: Dict[str, str]) -> Tuple[bool, Optional[str], Optional[str]]:
     tid = (row.get("template_id") or "").strip()
     if tid:
@@ -264,11 +466,14 @@ def ensure_template_id_for_row(row: Dict[str, str]) -> Tuple[bool, Optional[str]
     if not tname:
         return False, None, "missing template_id and template_name"
     resolved = TEMPLATES.resolve(tname)
+    if not resolved and REFRESH_TEMPLATES:
+        # template may have been added/renamed since the list was fetched
+        TEMPLATES.refresh()
+        resolved = TEMPLATES.resolve(tname)
     if resolved:
         row["template_id"] = resolved
         return True, resolved, None
-    all_items = get_json_v3_templates()
-    names_hint = ", ".join(sorted({it.get("name","") for it in all_items if it.get("name")}))
+    names_hint = ", ".join(TEMPLATES.names())
     return False, None, f"could not resolve template_id from template_name='{tname}'. Available names: {names_hint}"
 
 # --- ZIA Locations list (for name→id resolution) ---
@@ -283,7 +488,7 @@ def get_json_v3_locations() -> List[Dict[str, Any]]:
     # We'll use get_json with base_v3 logic manually or add a helper if we had one.
     # But wait, we have API_V3 global.
     url = f"{API_V3}/settings/locations"
-    headers = _v3_headers()
+    headers = _V3_HEADERS
     try:
         data = get_json(url, params=params, headers=headers)
     except RuntimeError:
@@ -298,19 +503,24 @@ class LocationResolver:
     def __init__(self):
         self._by_lower_name: Dict[str, int] = {}
         self._loaded = False
+        self._lock = threading.Lock()
     
     def _load(self):
         if self._loaded:
             return
-        locs = get_json_v3_locations()
-        for l in locs:
-            nm = str(l.get("name") or "").strip()
-            lid = l.get("id")
-            if nm and lid:
-                self._by_lower_name[nm.lower()] = int(lid)
-        self._loaded = True
+        with self._lock:
+            if self._loaded:
+                return
+            by_name: Dict[str, int] = {}
+            for l in get_json_v3_locations():
+                nm = str(l.get("name") or "").strip()
+                lid = l.get("id")
+                if nm and lid:
+                    by_name[nm.lower()] = int(lid)
+            self._by_lower_name = by_name
+            self._loaded = True
         if DEBUG:
-            print(f"Loaded {len(self._by_lower_name)} ZIA locations")
+            log.debug(f"Loaded {len(self._by_lower_name)} ZIA locations")
 
     def resolve(self, name: str) -> Optional[int]:
         if not name: return None
@@ -320,8 +530,10 @@ class LocationResolver:
 ZIA_LOCATIONS = LocationResolver()
 
 # -------- value normalization --------
+_TRUE = frozenset({"1", "true", "yes", "y", "on"})
+
 def _clean_bool(v: Any) -> bool:
-    return str(v).strip().lower() in ("1","true","yes","y")
+    return (v if isinstance(v, str) else str(v)).strip().lower() in _TRUE
 
 def _split_dhcp(start: str, end: str) -> Optional[str]:
     s = (start or "").strip(); e = (end or "").strip()
@@ -329,29 +541,43 @@ def _split_dhcp(start: str, end: str) -> Optional[str]:
     if s and e: return f"{s}-{e}"
     return None
 
+# CSV spellings -> API dhcp_service values (hyphen and underscore forms both accepted)
+_DHCP_MAP = {
+    "on": "inherit", "inherit": "inherit",
+    "non_airgapped": "non_airgapped", "non-airgapped": "non_airgapped",
+    "no_dhcp": "no_dhcp", "no-dhcp": "no_dhcp", "off": "no_dhcp",
+}
+
 def norm_dhcp_service(val: str, has_range: bool) -> str:
-    v = (val or "").strip().lower().replace("-", "_")
-    if v == "on": return "inherit"
-    if v in ("inherit", "non_airgapped", "no_dhcp"): return v
-    if v == "off": return "no_dhcp"
+    hit = _DHCP_MAP.get((val or "").strip().lower())
+    if hit: return hit
     return "inherit" if has_range else "no_dhcp"
 
 # -------- VLAN loading (CSV or JSON) --------
 def _vlan_from_csv_row(r: Dict[str, str]) -> Dict[str, Any]:
-    dhcp_range = _split_dhcp(r.get("dhcp_start"), r.get("dhcp_end"))
-    svc = norm_dhcp_service(r.get("dhcp_service", ""), bool(dhcp_range))
+    g = r.get
+    def S(k: str) -> str:
+        return (g(k) or "").strip()
+    name = S("name")
+    gw = S("default_gateway")
+    dhcp_range = _split_dhcp(g("dhcp_start"), g("dhcp_end"))
+    svc = norm_dhcp_service(g("dhcp_service", ""), bool(dhcp_range))
+    subnet = S("subnet")
     return {
-        "name": (r.get("name") or "").strip(),
-        "display_name": (r.get("name") or "").strip(),
-        "interface": (r.get("interface") or "").strip(),
-        "subnet": str(r.get("subnet") or "").strip(),
-        "tag": str(r.get("tag") or "").strip(),
-        "default_gateway": (r.get("default_gateway") or "").strip(),
-        "start_ip": (r.get("default_gateway") or "").strip(),
-        "zone": (r.get("zone") or "").strip() or "LAN Zone",
-        "enabled": _clean_bool(r.get("enabled","true")),
-        "share_over_vpn": _clean_bool(r.get("share_over_vpn","false")),
+        "name": name,
+        "display_name": name,
+        "interface": S("interface"),
+        "subnet": subnet,
+        "tag": S("tag"),
+        "default_gateway": gw,
+        "start_ip": gw,
+        "zone": S("zone") or "LAN Zone",
+        "enabled": _clean_bool(g("enabled","true")),
+        "share_over_vpn": _clean_bool(g("share_over_vpn","false")),
         "dhcp_service": svc,
+        # precomputed for vlan_to_v2_payload
+        "safe_name": _short_name(name, 16),
+        "ip_range": _network_base_from_start(gw, subnet) or "",
         **({"dhcp_range": dhcp_range} if dhcp_range else {})
     }
 
@@ -359,9 +585,18 @@ def load_vlans(vlans_file: str) -> List[Dict[str, Any]]:
     p = pathlib.Path(vlans_file)
     if not p.exists():
         raise FileNotFoundError(f"vlans_file not found: {vlans_file}")
+    p = p.resolve()
+    # VLAN dicts hold only scalars, so a per-dict copy keeps callers off the cached ones
+    return [dict(v) for v in _load_vlans_cached(str(p), p.stat().st_mtime)]
+
+@functools.lru_cache(maxsize=None)
+def _load_vlans_cached(abs_path: str, mtime: float) -> Tuple[Dict[str, Any], ...]:
+    # keyed by mtime too, so an edited file is re-parsed
+    return tuple(_parse_vlans(pathlib.Path(abs_path)))
+
+def _parse_vlans(p: pathlib.Path) -> List[Dict[str, Any]]:
     if p.suffix.lower() == ".csv":
-        rows = read_csv_rows(p)
-        return [_vlan_from_csv_row(r) for r in rows]
+        return [_vlan_from_csv_row(r) for r in iter_csv_rows(p)]
     with open(p, encoding="utf-8") as f:
         data = json.load(f)
     if isinstance(data, dict):
@@ -370,22 +605,52 @@ def load_vlans(vlans_file: str) -> List[Dict[str, Any]]:
     out = []
     for v in data:
         dhcp_range = v.get("dhcp_range")
+        name = (v.get("display_name") or v.get("name") or "").strip()
+        gw = (v.get("start_ip") or v.get("default_gateway") or "").strip()
+        subnet = str(v.get("subnet") or "").strip()
         out.append({
-            "name": (v.get("display_name") or v.get("name") or "").strip(),
-            "display_name": (v.get("display_name") or v.get("name") or "").strip(),
+            "name": name,
+            "display_name": name,
             "interface": (v.get("interface") or "").strip(),
-            "subnet": str(v.get("subnet") or "").strip(),
+            "subnet": subnet,
             "tag": str(v.get("tag") or "").strip(),
-            "default_gateway": (v.get("start_ip") or v.get("default_gateway") or "").strip(),
-            "start_ip": (v.get("start_ip") or v.get("default_gateway") or "").strip(),
+            "default_gateway": gw,
+            "start_ip": gw,
             "zone": (v.get("zone") or "").strip() or "LAN Zone",
             "enabled": True,
             "share_over_vpn": bool(v.get("share_over_vpn", False)),
             "dhcp_service": norm_dhcp_service(v.get("dhcp_service",""), bool(dhcp_range)),
+            "safe_name": _short_name(name, 16),
+            "ip_range": _network_base_from_start(gw, subnet) or v.get("ip_range") or "",
             **({"dhcp_range": dhcp_range} if dhcp_range else {})
         })
     return out
 
+# Parsed VLAN files for this run, keyed by the vlans_file value from sites.csv
+VLAN_CACHE: Dict[str, List[Dict[str, Any]]] = {}
+VLAN_PRELOAD_WORKERS = 8
+
+def preload_vlans(paths: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Load each distinct VLAN file once, concurrently. Files that fail are left out
+    so the per-site path reports the error as before."""
+    uniq = list(dict.fromkeys(p for p in paths if p))
+    if not uniq:
+        return {}
+    def _try_load(path: str):
+        try:
+            return load_vlans(path)
+        except Exception:
+            return None
+    with ThreadPoolExecutor(max_workers=min(VLAN_PRELOAD_WORKERS, len(uniq))) as ex:
+        loaded = dict(zip(uniq, ex.map(_try_load, uniq)))
+    return {p: v for p, v in loaded.items() if v is not None}
+
+def get_vlans(vlans_file: str) -> List[Dict[str, Any]]:
+    hit = VLAN_CACHE.get(vlans_file)
+    if hit is not None:
+        return hit
+    return load_vlans(vlans_file)
+
 # -------- HA validation (sites.csv sanity) --------
 def validate_row_is_ha_consistent(row: Dict[str, str]) -> None:
     b_name = (row.get("gateway_name_b") or "").strip()
@@ -413,26 +678,52 @@ def get_json_v3_gateway_list(site_name: str) -> Dict[str, Any]:
         "sort": "location",
         "search": site_name,
         "page": 0,
-        "limit": 100,
+        "limit": GATEWAY_PAGE_LIMIT,
         "refresh_token": "enabled",
     }
     return get_json_v3_gateway(params)
 
+def _gateway_rows(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return data.get("rows") or data.get("result",{}).get("rows",[]) or []
+
+def _site_row_name(r: Dict[str, Any]) -> str:
+    return (r.get("location_display_name") or r.get("site_name") or r.get("location") or "").strip().lower()
+
 def find_site_row_by_name(site_name: str) -> Optional[Dict[str, Any]]:
-    data = get_json_v3_gateway_list(site_name)
-    rows = data.get("rows") or data.get("result",{}).get("rows",[]) or []
     wanted = site_name.strip().lower()
-    for r in rows:
-        nm = (r.get("location_display_name") or r.get("site_name") or r.get("location") or "").strip().lower()
-        if nm == wanted:
+    for r in _gateway_rows(get_json_v3_gateway_list(site_name)):
+        if _site_row_name(r) == wanted:
             return r
     return None
 
+def _extract_site_id(row: Dict[str, Any]) -> Optional[str]:
+    # Try multiple fields for site_id, similar to pull_site.py
+    ci = row.get("cluster_info") or {}
+    return ci.get("site_id") or row.get("site_id") or row.get("id")
+
 def get_gateway_detail_v3(gateway_id: str) -> Dict[str, Any]:
     return get_json_v3_detail(f"Gateway/{gateway_id}")
 
+def _cluster_id_from_gateway_detail(gateway_id: str) -> Optional[int]:
+    try:
+        d = get_gateway_detail_v3(gateway_id)
+    except Exception:
+        return None
+    if isinstance(d, dict) and isinstance(d.get("result"), dict):
+        d = d["result"]
+    if not isinstance(d, dict):
+        return None
+    cid = d.get("cluster_id") or (d.get("cluster_info") or {}).get("cluster_id")
+    try:
+        return int(cid) if cid else None
+    except (TypeError, ValueError):
+        return None
+
+_CLUSTER_ID_RE = re.compile(r'"cluster[_ ]?id"\s*:\s*(\d+)', re.IGNORECASE)
+
 def _parse_cluster_id_from_create_resp(text: str) -> Optional[int]:
-    if not text:
+    # Neither the JSON keys nor the regex fallback can match without "cluster"
+    if not text or "cluster" not in text.lower():
         return None
     try:
         j = json.loads(text)
@@ -452,7 +743,7 @@ def _parse_cluster_id_from_create_resp(text: str) -> Optional[int]:
                             pass
     except Exception:
         pass
-    m = re.search(r'"cluster[_ ]?id"\s*:\s*(\d+)', text, re.IGNORECASE)
+    m = _CLUSTER_ID_RE.search(text)
     if m:
         try:
             return int(m.group(1))
@@ -460,9 +751,13 @@ def _parse_cluster_id_from_create_resp(text: str) -> Optional[int]:
             return None
     return None
 
-def resolve_gateway_ids_and_cluster(site_name: str, *, prefer_cluster_id: Optional[int] = None, retries: int = POLL_RETRIES, delay: float = POLL_DELAY_S) -> Tuple[Optional[str], Optional[int]]:
+def resolve_gateway_ids_and_cluster(site_name: str, *, prefer_cluster_id: Optional[int] = None, retries: int = POLL_RETRIES, base_delay: float = POLL_BASE_DELAY_S, max_delay: float = POLL_MAX_DELAY_S, total_budget: float = POLL_TOTAL_BUDGET_S) -> Tuple[Optional[str], Optional[int], Optional[Dict[str, Any]]]:
+    # also hands back the last matched gateway-list row so callers can read site ids without another lookup
     wanted_cluster = prefer_cluster_id
-    for _ in range(max(1, retries)):
+    attempts = max(1, retries)
+    deadline = time.monotonic() + total_budget
+    row = None
+    for attempt in range(attempts):
         row = find_site_row_by_name(site_name)
         gw_ids_str = None
         cl_id = wanted_cluster
@@ -479,14 +774,20 @@ def resolve_gateway_ids_and_cluster(site_name: str, *, prefer_cluster_id: Option
                 cl_id = int(found_cluster)
 
         if wanted_cluster and gw_ids_str:
-            return gw_ids_str, int(wanted_cluster)
+            return gw_ids_str, int(wanted_cluster), row
+        if gw_ids_str and not cl_id:
+            # gateways are listed but cluster_info lags: ask the gateway itself before sleeping
+            cl_id = _cluster_id_from_gateway_detail(gw_ids_str.split(",")[0])
         if gw_ids_str and cl_id:
-            return gw_ids_str, int(cl_id)
-        time.sleep(delay)
+            return gw_ids_str, int(cl_id), row
+        if attempt == attempts - 1 or time.monotonic() >= deadline:
+            break
+        _backoff_sleep(attempt, base_delay, max_delay)
 
-    return None, wanted_cluster if wanted_cluster else None
+    return None, wanted_cluster if wanted_cluster else None, row
 
 # -------- Interfaces discovery (v2) --------
+@functools.lru_cache(maxsize=256)
 def get_gateway_interfaces_v2(site_id: str) -> List[Dict[str, Any]]:
     """
     GET /api/v2/Gateway/interfaces?siteID=<site_id>
@@ -495,14 +796,11 @@ def get_gateway_interfaces_v2(site_id: str) -> List[Dict[str, Any]]:
       {"gateway_id":"...","gateway_name":"...", "interfaces":[{"name":"ge4","interface_type":"ha"}, ...]},
       ...
     ]
+    Cached per site_id for the run; callers must not mutate the result.
     """
     url = f"{API_V2}/Gateway/interfaces"
     params = {"siteID": site_id, "refresh_token": "enabled"}
-    headers = {
-        "Accept": "application/json, text/plain, */*",
-        "Origin": ORIGIN, "Referer": REFERER,
-    }
-    data = get_json(url, params=params, headers=headers)
+    data = get_json(url, params=params)
     return data if isinstance(data, list) else []
 
 def discover_iface_inventory(site_id: str, gateways_str: str):
@@ -540,10 +838,10 @@ def discover_iface_inventory(site_id: str, gateways_str: str):
     common_trackables = set.intersection(*per_gw_trackables) if per_gw_trackables else set()
 
     if DEBUG:
-        print("Interfaces discovery:")
-        print("  HA link map:", ha_link_map)
-        print("  mgmt names :", mgmt_names)
-        print("  common trackables:", sorted(common_trackables))
+        log.debug("Interfaces discovery:")
+        log.debug("  HA link map: %s", ha_link_map)
+        log.debug("  mgmt names : %s", mgmt_names)
+        log.debug("  common trackables: %s", sorted(common_trackables))
 
     return ha_link_map, mgmt_names, common_trackables
 
@@ -552,15 +850,9 @@ def _clean_iface(x: str) -> str:
     return (x or "").strip().lower()
 
 def _unique_preserve(seq: Iterable[str]) -> List[str]:
-    out: List[str] = []
-    seen: Set[str] = set()
-    for s in seq:
-        s = _clean_iface(s)
-        if not s or s in seen:
-            continue
-        seen.add(s)
-        out.append(s)
-    return out
+    # dicts keep insertion order: ordered dedupe in one C-level pass
+    cleaned = [c for c in map(_clean_iface, seq) if c]
+    return list(dict.fromkeys(cleaned))
 
 def _collect_wan_ifaces_from_row(row: Dict[str, str]) -> List[str]:
     candidates = [
@@ -576,34 +868,24 @@ def _collect_wan_ifaces_from_row(row: Dict[str, str]) -> List[str]:
 
 def _collect_lan_ifaces_from_vlans(vlans: List[Dict[str, Any]], exclude: Iterable[str]) -> List[str]:
     ex = { _clean_iface(x) for x in exclude }
+    seen: Set[str] = set()
     found: List[str] = []
     for v in vlans:
-        iface = _clean_iface(v.get("interface", ""))
-        if not iface:
-            continue
-        iface = iface.split(",")[0].strip()
-        if "." in iface:
-            iface = iface.split(".", 1)[0]
-        if not iface or iface == "mgmt" or iface in ex:
+        # first member of "ge3,ge4" / parent of "ge3.100"
+        iface = _clean_iface(v.get("interface", "")).split(",", 1)[0].strip().split(".", 1)[0]
+        if not iface or iface == "mgmt" or iface in ex or iface in seen:
             continue
-        if iface not in found:
-            found.append(iface)
+        seen.add(iface)
+        found.append(iface)
     return found
 
-def _vrrp_headers() -> Dict[str, str]:
-    return {
-        "Accept": "application/json, text/plain, */*",
-        "Origin": ORIGIN,
-        "Referer": REFERER,
-        "X-Requested-With": "XMLHttpRequest",
-        "Content-Type": "application/json",
-    }
+_VRRP_HEADERS: Dict[str, str] = _V3_HEADERS
 
 def _vrrp_url(cluster_id: int) -> str:
     return f"{API_V3}/vrrp/config/{cluster_id}?refresh_token=enabled"
 
 def post_vrrp(url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> Tuple[bool, str, int]:
-    body = json.dumps(payload)
+    body = _dumps(payload)
     r = post_raw(url, body, headers=headers, timeout=60)
     return (r.status_code in (200, 204)), (r.text or "")[:300], r.status_code
 
@@ -651,26 +933,32 @@ def build_vrrp_payload(
                 f"Add vrrp_link_interface in sites.csv or verify template brings up HA ports."
             )
 
-    # Build candidate track list from CSVs
+    # Candidate track list from CSVs
     wan_ifaces = _collect_wan_ifaces_from_row(row)
     lan_ifaces = _collect_lan_ifaces_from_vlans(vlans, exclude=wan_ifaces)
-    raw_track = _unique_preserve([*wan_ifaces, *lan_ifaces])
 
     # Exclusions: mgmt, HA link (from discovery or override), and ensure present on all peers
     ha_names = set(ha_link_map.values())
     link_name_to_exclude = csv_link or (next(iter(ha_names)) if ha_names else "")
-    track_filtered = [
-        i for i in raw_track
-        if i and i not in mgmt_names and i != "mgmt" and i != link_name_to_exclude
-    ]
-    track_final = [i for i in track_filtered if i in common_trackables]
+
+    # Single pass: dedupe + exclusions + intersection with peer-common names
+    track_final: List[str] = []
+    seen: Set[str] = set()
+    for i in itertools.chain(wan_ifaces, lan_ifaces):
+        ci = _clean_iface(i)
+        if (ci and ci not in seen and ci != "mgmt" and ci not in mgmt_names
+                and ci != link_name_to_exclude and ci in common_trackables):
+            seen.add(ci)
+            track_final.append(ci)
 
     # Optional extras from CSV (apply same filters)
     extras = (row.get("vrrp_track_extra") or "").strip().lower()
     if extras:
-        extra_list = [x.strip() for x in extras.split(",") if x.strip()]
-        for e in extra_list:
-            if e in common_trackables and e not in mgmt_names and e != link_name_to_exclude and e not in track_final:
+        for e in extras.split(","):
+            e = e.strip()
+            if (e and e not in seen and e not in mgmt_names
+                    and e != link_name_to_exclude and e in common_trackables):
+                seen.add(e)
                 track_final.append(e)
 
     if not track_final:
@@ -696,14 +984,14 @@ def build_vrrp_payload(
     }
 
     if DEBUG:
-        print("VRRP payload (keys redacted):", json.dumps(payload, indent=2))
+        log.debug("VRRP payload (keys redacted): %s", json.dumps(payload, indent=2))
 
     return payload, link_iface_used, track_value
 
 # -------- site creation (v3) --------
 def create_site(template_id: str, payload: Dict[str, Any]) -> Tuple[bool, str, Optional[int]]:
-    url = f"{API_V3}/templates/{template_id}/deploy_site?refresh_token=enabled"
-    r = post_json(url, payload, headers=_v3_headers())
+    url = f"{_V3_TEMPLATES_PREFIX}{template_id}/deploy_site{_REFRESH_QS}"
+    r = post_json(url, payload, headers=_V3_HEADERS)
     cid = None
     try:
         cid = _parse_cluster_id_from_create_resp(r.text or "")
@@ -714,16 +1002,20 @@ def create_site(template_id: str, payload: Dict[str, Any]) -> Tuple[bool, str, O
     return False, f"{r.status_code} {r.text[:300]}", cid
 
 # --- v2 VLAN helpers ---
+@functools.lru_cache(maxsize=1024)
+def _net_base(start_ip: str, subnet_bits: str) -> Optional[str]:
+    try:
+        net = ipaddress.ip_network(f"{start_ip}/{subnet_bits}", strict=False)
+        return str(net.network_address)
+    except Exception:
+        return None
+
 def _network_base_from_start(start_ip: str, subnet_bits: str) -> Optional[str]:
     s = (start_ip or "").strip()
     b = (subnet_bits or "").strip()
     if not s or not b:
         return None
-    try:
-        net = ipaddress.ip_network(f"{s}/{b}", strict=False)
-        return str(net.network_address)
-    except Exception:
-        return None
+    return _net_base(s, b)
 
 def _short_name(name: str, maxlen: int = 16) -> str:
     n = (name or "").strip()
@@ -736,17 +1028,16 @@ def _maybe_dup_interface_for_ha(interface: str, gateways_str: str) -> str:
     return interface
 
 def vlan_to_v2_payload(vlan: Dict[str, Any], gateways_str: str, cluster_id: int, per_network_dns: str = "") -> Dict[str, Any]:
-    start_ip = vlan.get("start_ip") or vlan.get("default_gateway") or ""
-    subnet   = str(vlan.get("subnet") or "").strip()
-    ip_range = _network_base_from_start(start_ip, subnet) or vlan.get("ip_range") or ""
-    display   = vlan.get("display_name") or vlan.get("name") or ""
-    safe_name = _short_name(vlan.get("name") or display, 16)
+    # load_vlans has already stripped/normalized everything and precomputed
+    # safe_name and ip_range, so this is plain dict assembly
+    start_ip = vlan["start_ip"]
+    display  = vlan["display_name"]
     interface = _maybe_dup_interface_for_ha(vlan.get("interface") or "", gateways_str)
     return {
-        "subnet": subnet,
-        "tag": str(vlan.get("tag") or "").strip(),
+        "subnet": vlan["subnet"],
+        "tag": vlan["tag"],
         "display_name": display,
-        "ip_range": ip_range,
+        "ip_range": vlan["ip_range"],
         "zone": vlan.get("zone") or "LAN Zone",
         "per_network_dns": (per_network_dns or "").strip(),
         "dns_forwarding": False,
@@ -756,36 +1047,36 @@ def vlan_to_v2_payload(vlan: Dict[str, Any], gateways_str: str, cluster_id: int,
         "default_gateway": start_ip,
         "gateways": gateways_str,
         "interface": interface,
-        "name": safe_name,
+        "name": vlan["safe_name"],
         "cluster_id": int(cluster_id),
         "event_type": "addnetwork",
-        "dhcp_service": norm_dhcp_service(vlan.get("dhcp_service",""), bool(vlan.get("dhcp_range"))),
-        "share_over_vpn": bool(vlan.get("share_over_vpn", False)),
-        "enabled": bool(vlan.get("enabled", True)),
+        "dhcp_service": vlan["dhcp_service"],
+        "share_over_vpn": vlan["share_over_vpn"],
+        "enabled": vlan["enabled"],
     }
 
-def post_vlan(vlan_payload: Dict[str, Any]) -> Tuple[bool, str]:
-    url = f"{API_V2}/Network/?refresh_token=enabled"
-    headers = {
-        "Accept": "application/json, text/plain, */*",
-        "Origin": ORIGIN,
-        "Referer": REFERER,
-        "Content-Type": "application/json",
-    }
-    r = post_json(url, vlan_payload, headers=headers)
+def _created_id(text: str) -> Optional[str]:
+    # POST /Network/ answers with the new object: {"id": ...} or {"result": {"id": ...}}
+    try:
+        data = _loads(text)
+    except ValueError:
+        return None
+    if isinstance(data, dict):
+        inner = data.get("result") if isinstance(data.get("result"), dict) else data
+        vid = inner.get("id") or data.get("id")
+        return str(vid) if vid else None
+    return None
+
+def post_vlan(vlan_payload: Dict[str, Any]) -> Tuple[bool, str, Optional[str]]:
+    r = post_json(_V2_NETWORK_CREATE_URL, vlan_payload)
     if r.status_code in (200,201,202):
-        return True, r.text
-    return False, f"{r.status_code} {r.text[:300]}"
+        return True, r.text, _created_id(r.text)
+    return False, f"{r.status_code} {r.text[:300]}", None
 
 def list_site_vlans_v2(site_id: str) -> List[Dict[str, Any]]:
-    url = f"{API_V2}/Network/"
+    url = _V2_NETWORK_LIST_URL
     params = {"siteId": site_id, "refresh_token": "enabled"}
-    headers = {
-        "Accept": "application/json, text/plain, */*",
-        "Origin": ORIGIN,
-        "Referer": REFERER,
-    }
-    data = get_json(url, params=params, headers=headers)
+    data = get_json(url, params=params)
     if isinstance(data, dict):
         rows = data.get("rows") or data.get("result", {}).get("rows")
         return rows or []
@@ -800,6 +1091,19 @@ def _vlan_key(v: Dict[str, Any]) -> Tuple[str, str, str, str]:
     gw = (v.get("default_gateway") or v.get("start_ip") or "").strip()
     return (nm, tg, iface, gw)
 
+def _current_private_dns(url: str, params: Dict[str, str]) -> Optional[List[str]]:
+    # Best effort: None means "unknown", and the caller then just PUTs
+    try:
+        data = get_json(url, params=params, headers=_PLAIN_JSON_HEADERS)
+    except Exception:
+        return None
+    if isinstance(data, dict) and isinstance(data.get("result"), dict):
+        data = data["result"]
+    if not isinstance(data, dict):
+        return None
+    prefixes = (data.get("member_attributes") or {}).get("ip_prefix")
+    return [str(p) for p in prefixes] if isinstance(prefixes, list) else None
+
 def configure_private_dns(session: requests.Session, api_v2: str, site_id: str, private_dns_ips: str, dry_run: bool = False) -> bool:
     """
     Configures Private DNS for the site by adding IPs to the 'System-Private-DNS-Servers-Group'.
@@ -821,7 +1125,7 @@ def configure_private_dns(session: requests.Session, api_v2: str, site_id: str,
         return True
 
     if dry_run:
-        print(f"   [DRY-RUN] Would configure Private DNS for site {site_id}: {ips}")
+        log.info(f"   [DRY-RUN] Would configure Private DNS for site {site_id}: {ips}")
         return True
 
     # Use the exact pattern from the screenshot:
@@ -841,141 +1145,135 @@ def configure_private_dns(session: requests.Session, api_v2: str, site_id: str,
         }
     }
 
+    # Skip the write when the group already holds exactly these prefixes (re-runs on existing sites)
+    current = _current_private_dns(url, params)
+    if current is not None and sorted(current) == sorted(ips):
+        log.info(f"   ✅ Private DNS unchanged: {ips}")
+        return True
+
     try:
         # We updated put_json to accept params
-        r = put_json(url, payload, headers={"Accept": "application/json", "Content-Type": "application/json"}, params=params)
+        r = put_json(url, payload, headers=_PLAIN_JSON_HEADERS, params=params)
         if r.status_code in (200, 201, 204):
-            print(f"   ✅ Configured Private DNS: {ips}")
+            log.info(f"   ✅ Configured Private DNS: {ips}")
             return True
         else:
-            print(f"   ❌ Failed to configure Private DNS: {r.status_code} {r.text[:200]}")
+            log.error(f"   ❌ Failed to configure Private DNS: {r.status_code} {r.text[:200]}")
             return False
     except Exception as e:
-        print(f"   ❌ Error configuring Private DNS: {e}")
+        log.error(f"   ❌ Error configuring Private DNS: {e}")
         return False
 
-def process_vlans_for_site(session: requests.Session, api_v2: str, site_id: str, gw_ids: str, cluster_id: int, vlans_file: str, row: Dict[str, str], dry_run: bool = False):
-    if not vlans_file or not os.path.exists(vlans_file):
-        return
-
-    try:
-        vlans = load_vlans(vlans_file)
-    except Exception as e:
-        print(f"   ⚠️  Failed to load VLANs from {vlans_file}: {e}")
-        return
-
-    print(f"   Processing {len(vlans)} VLANs from {os.path.basename(vlans_file)}...")
+def process_vlans_for_site(session: requests.Session, api_v2: str, site_id: str, gw_ids: str, cluster_id: int, vlans: List[Dict[str, Any]], row: Dict[str, str], dry_run: bool = False):
+    # vlans: the row's parsed vlans_file (loaded once by process_site)
+    log.info(f"   Processing {len(vlans)} VLANs from {os.path.basename(row.get('vlans_file') or '')}...")
     
     # Use wan_dns as default for per_network_dns if not specified
     per_net_dns = (row.get("wan_dns") or "").strip()
 
     vlan_ok = 0; vlan_fail = 0
-    for v in vlans:
-        v2_payload = vlan_to_v2_payload(v, gw_ids, cluster_id, per_network_dns=per_net_dns)
-        
-        if dry_run:
-             print(f"   [DRY-RUN] Would POST VLAN {v.get('name')} tag={v.get('tag')}")
-             vlan_ok += 1
-             continue
+    items = [(vlan_to_v2_payload(v, gw_ids, cluster_id, per_network_dns=per_net_dns), v) for v in vlans]
+    # Normalized match keys, computed once per CSV VLAN and reused by every lookup below
+    keys = [_vlan_key(v) for v in vlans]
+    created_ids: Dict[Tuple[str,str,str,str], str] = {}
 
-        okv, m = post_vlan(v2_payload)
-        if okv:
+    if dry_run:
+        for _, v in items:
+            log.info(f"   [DRY-RUN] Would POST VLAN {v.get('name')} tag={v.get('tag')}")
             vlan_ok += 1
-        else:
-            vlan_fail += 1
-            print(f"    ❌ VLAN ERR: {m}")
-    
-    print(f"   ✅ VLANs processed: OK={vlan_ok} ERR={vlan_fail}")
+    elif items:
+        # VLAN creates are independent; fan them out over the pooled session
+        for k, (okv, m, cid) in zip(keys, _map_concurrently(post_vlan, [p for p, _ in items])):
+            if okv:
+                vlan_ok += 1
+                if cid:
+                    created_ids[k] = cid
+            else:
+                vlan_fail += 1
+                log.error(f"    ❌ VLAN ERR: {m}")
+
+    log.info(f"   ✅ VLANs processed: OK={vlan_ok} ERR={vlan_fail}")
 
     # Post-processing: Enable and Share Over VPN (Restored from original logic)
     if dry_run:
         return
 
-    current = list_site_vlans_v2(str(site_id))
-    id_map: Dict[Tuple[str,str,str,str], Dict[str,Any]] = {_vlan_key(v): v for v in current}
-
-    def find_id_for(csv_vlan: Dict[str,Any]) -> Optional[str]:
-        k = _vlan_key(csv_vlan)
-        hit = id_map.get(k)
-        if hit and hit.get("id"):
-            return hit["id"]
-        nm = (csv_vlan.get("display_name") or csv_vlan.get("name") or "").strip().lower()
-        tg = str(csv_vlan.get("tag") or "").strip()
-        for v in current:
-            if (v.get("display_name") or v.get("name") or "").strip().lower() == nm and str(v.get("tag") or "") == tg:
-                if v.get("id"):
-                    return v["id"]
-        return None
-
-    v2_hdrs = {
-        "Accept": "application/json, text/plain, */*",
-        "Origin": ORIGIN,
-        "Referer": REFERER,
-        "Content-Type": "application/json",
-    }
-
-    # a) Enable (PUT status="provisioned")
-    for v in vlans:
-        if not v.get("enabled", True):
+    # Ids come from the POST responses; list the site's VLANs once only if some are missing
+    # (failed/duplicate creates, or a response without an id), indexed by full key and (name, tag)
+    id_by_key: Dict[Tuple[str,str,str,str], str] = dict(created_ids)
+    id_by_name_tag: Dict[Tuple[str,str], str] = {}
+    needed = [k for k, v in zip(keys, vlans) if v.get("enabled", True) or v.get("share_over_vpn", False)]
+    if any(k not in created_ids for k in needed):
+        for v in list_site_vlans_v2(str(site_id)):
+            vid = v.get("id")
+            if not vid:
+                continue
+            k = _vlan_key(v)
+            id_by_key.setdefault(k, vid)
+            id_by_name_tag.setdefault((k[0], k[1]), vid)
+
+    def find_id_for(k: Tuple[str,str,str,str]) -> Optional[str]:
+        return id_by_key.get(k) or id_by_name_tag.get((k[0], k[1]))
+
+    # Single pass over the CSV: per VLAN, enable (PUT status="provisioned") then share_over_vpn (PATCH).
+    # VLANs are dispatched concurrently; within one VLAN the PUT still precedes the PATCH.
+    jobs: List[Tuple[str, Optional[Dict[str, Any]], bool]] = []
+    for k, v in zip(keys, vlans):
+        want_enable = bool(v.get("enabled", True))
+        want_share = bool(v.get("share_over_vpn", False))
+        if not (want_enable or want_share):
             continue
-        vid = find_id_for(v)
+        vid = find_id_for(k)
         if not vid:
-            print(f"    ⚠️  WARN enable: could not match VLAN id for {v.get('name')}/{v.get('tag')}")
+            if want_enable:
+                log.warning(f"    ⚠️  WARN enable: could not match VLAN id for {v.get('name')}/{v.get('tag')}")
+            if want_share:
+                log.warning(f"    ⚠️  WARN share_over_vpn: could not match VLAN id for {v.get('name')}/{v.get('tag')}")
             continue
-        
-        # Only update if needed? The original code just did it.
-        url = f"{api_v2}/Network/update/{vid}?refresh_token=enabled"
-        payload = {
+        enable_payload = {
             "name": v.get("display_name") or v.get("name") or "",
             "subnet": str(v.get("subnet") or ""),
             "per_network_dns": (per_net_dns or ""),
             "status": "provisioned",
-        }
-        try:
-            r_put = put_json(url, payload, headers=v2_hdrs)
-            if r_put.status_code not in (200, 204):
-                print(f"    ⚠️  WARN enable PUT {vid}: {r_put.status_code} {r_put.text[:180]}")
-            else:
-                # print(f"    ✅ Enabled VLAN {v.get('name')}") # Optional: reduce noise
-                pass
-        except Exception as e:
-            print(f"    ⚠️  Error enabling VLAN {vid}: {e}")
+        } if want_enable else None
+        jobs.append((vid, enable_payload, want_share))
 
-    # b) share_over_vpn (PATCH)
-    for v in vlans:
-        if not v.get("share_over_vpn", False):
-            continue
-        vid = find_id_for(v)
-        if not vid:
-            print(f"    ⚠️  WARN share_over_vpn: could not match VLAN id for {v.get('name')}/{v.get('tag')}")
-            continue
-        
-        url = f"{api_v2}/Network/share-over-vpn?refresh_token=enabled"
-        payload = {"id": vid, "share_over_vpn": True}
-        try:
-            r_patch = patch_json(url, payload, headers=v2_hdrs)
-            if r_patch.status_code not in (200, 204):
-                print(f"    ⚠️  WARN share_over_vpn PATCH {vid}: {r_patch.status_code} {r_patch.text[:180]}")
-            else:
-                # print(f"    ✅ Shared VLAN {v.get('name')} over VPN")
-                pass
-        except Exception as e:
-            print(f"    ⚠️  Error sharing VLAN {vid}: {e}")
+    # per-VLAN URLs are plain concatenation onto these
+    update_prefix = f"{api_v2}/Network/update/"
+    share_url = f"{api_v2}/Network/share-over-vpn{_REFRESH_QS}"
 
-def configure_vrrp(session: requests.Session, api_v2: str, gw_ids: str, cluster_id: int, vlans_file: str, row: Dict[str, str], site_id: str, dry_run: bool = False):
-    # 1. Load VLANs (needed for track interface discovery)
-    try:
-        vlans = load_vlans(vlans_file) if vlans_file else []
-    except:
-        vlans = []
-    
-    # 2. Build payload
+    def _finish_vlan(job: Tuple[str, Optional[Dict[str, Any]], bool]) -> List[str]:
+        vid, enable_payload, share = job
+        msgs: List[str] = []
+        if enable_payload is not None:
+            try:
+                r_put = put_json(update_prefix + str(vid) + _REFRESH_QS, enable_payload)
+                if r_put.status_code not in (200, 204):
+                    msgs.append(f"    ⚠️  WARN enable PUT {vid}: {r_put.status_code} {r_put.text[:180]}")
+            except Exception as e:
+                msgs.append(f"    ⚠️  Error enabling VLAN {vid}: {e}")
+        if share:
+            try:
+                r_patch = patch_json(share_url, {"id": vid, "share_over_vpn": True})
+                if r_patch.status_code not in (200, 204):
+                    msgs.append(f"    ⚠️  WARN share_over_vpn PATCH {vid}: {r_patch.status_code} {r_patch.text[:180]}")
+            except Exception as e:
+                msgs.append(f"    ⚠️  Error sharing VLAN {vid}: {e}")
+        return msgs
+
+    for msgs in _map_concurrently(_finish_vlan, jobs):
+        for msg in msgs:
+            log.warning(msg)
+
+def configure_vrrp(session: requests.Session, api_v2: str, gw_ids: str, cluster_id: int, vlans: List[Dict[str, Any]], row: Dict[str, str], site_id: str, dry_run: bool = False):
+    # vlans feed LAN track-interface discovery; [] when the row has no usable vlans_file
+    # Build payload
     try:
         payload, link_used, track_val = build_vrrp_payload(
             cluster_id, gw_ids, row, vlans, site_id=site_id, vrid=row.get("vrrp_vrid", "16")
         )
     except SystemExit as e:
-        print(f"   ❌ VRRP Config Failed: {e}")
+        log.error(f"   ❌ VRRP Config Failed: {e}")
         return
 
     if not payload:
@@ -983,219 +1281,272 @@ def configure_vrrp(session: requests.Session, api_v2: str, gw_ids: str, cluster_
         return
 
     if dry_run:
-        print(f"   [DRY-RUN] Would POST VRRP config for cluster {cluster_id}")
-        print(f"             Link: {link_used}, Track: {track_val}")
+        log.info(f"   [DRY-RUN] Would POST VRRP config for cluster {cluster_id}")
+        log.info(f"             Link: {link_used}, Track: {track_val}")
         return
 
     url = _vrrp_url(cluster_id)
-    headers = _vrrp_headers()
+    headers = _VRRP_HEADERS
     
     ok, msg, code = post_vrrp(url, headers, payload)
     if ok:
-         print(f"   ✅ VRRP Configured (Link={link_used}, Track={track_val})")
+         log.info(f"   ✅ VRRP Configured (Link={link_used}, Track={track_val})")
     else:
-         print(f"   ❌ VRRP Failed: {code} {msg}")
+         log.error(f"   ❌ VRRP Failed: {code} {msg}")
 
 # -------- main --------
+def process_site(r: Dict[str, str], dry_run: bool = False) -> Tuple[bool, str, str]:
+    """Create one sites.csv row end to end (site → DNS → VLANs → VRRP → ZPA). Returns (ok, site_name, message)."""
+    site_name   = (r.get("site_name") or "").strip()
+    template_id = (r.get("template_id") or "").strip()
+    vlans_file  = (r.get("vlans_file") or "").strip()
+
+    if not site_name:
+        log.warning("SKIP: row missing site_name"); return False, site_name, "missing site_name"
+
+    # Validate HA row consistency early
+    try:
+        validate_row_is_ha_consistent(r)
+    except SystemExit as e:
+        log.error(str(e)); return False, site_name, str(e)
+
+    # Resolve template_id if missing (from template_name)
+    if not template_id:
+        ok_tid, resolved_tid, err = ensure_template_id_for_row(r)
+        if not ok_tid or not resolved_tid:
+            log.warning(f"SKIP: {site_name}: {err}")
+            return False, site_name, err or "template_id not resolved"
+        template_id = resolved_tid
+        if DEBUG:
+            log.debug(f"Resolved template_name='{r.get('template_name')}' -> template_id={template_id}")
+
+    # --- DHCP relay inference & validation (per-site) ---
+    dhcp_ip = (r.get("dhcp_server_ip") or "").strip()
+    svc = (r.get("dhcp_service_mode") or "").strip().lower()
+    if svc not in ("", "relay", "server", "inherit"):
+        svc = ""
+    if not svc and dhcp_ip:
+        svc = "relay"
+    if svc == "relay" and not dhcp_ip:
+        log.error(f"ERR : {site_name}: dhcp_service=relay requires dhcp_server_ip in sites.csv")
+        return False, site_name, "dhcp_service=relay requires dhcp_server_ip"
+
+    # Jinja context
+    ctx = dict(r)
+    
+    # Resolve ZIA Location (if zia_location_name exists, try to find its ID)
+    zname = (r.get("zia_location_name") or "").strip()
+    existing_loc_id = None
+    if zname:
+        # We have a name, check if it exists in ZIA
+        existing_loc_id = ZIA_LOCATIONS.resolve(zname)
+        if existing_loc_id and DEBUG:
+            log.info(f"  Mapping zia_location_name='{zname}' -> existing_location_id={existing_loc_id}")
+            log.info(f"  INFO: Will use existing ZIA Location ID {existing_loc_id} ({zname})")
+        elif existing_loc_id:
+            # Always show this info even if not debug, since it changes behavior significantly
+            log.info(f"  INFO: Using existing ZIA Location ID {existing_loc_id} for '{zname}'")
+        elif zname and not existing_loc_id:
+            log.warning(f"  WARN: zia_location_name='{zname}' not found in ZIA, will create NEW location.")
+
+    ctx["template_id"] = template_id
+    ctx["dhcp_service_mode"] = svc
+    if existing_loc_id:
+        ctx["existing_location_id"] = existing_loc_id
+
+    # Render site payload
+    try:
+        rendered = render_template(ctx)
+        payload  = _loads(rendered)
+    except Exception as e:
+        log.error(f"ERR : {site_name}: template render failed: {e}")
+        return False, site_name, f"template render failed: {e}"
+
+    # Ensure DHCP keys as needed
+    if svc == "relay":
+        payload["dhcp_service"] = "relay"
+        payload["dhcp_server_ip"] = dhcp_ip
+    elif svc == "server":
+        payload["dhcp_service"] = "server"
+        payload.pop("dhcp_server_ip", None)
+
+    # Parse this row's VLANs once (usually a preload-cache hit); every step below reuses the list
+    vlans: List[Dict[str, Any]] = []
+    vlans_err: Optional[str] = None
+    if vlans_file:
+        try:
+            vlans = get_vlans(vlans_file)
+        except Exception as e:
+            vlans_err = str(e)
+
+    # If dry-run, preview and stop here
+    if dry_run:
+        if vlans_err:
+            log.warning(f"    VLAN load warn: {vlans_err}")
+        wan_preview = _collect_wan_ifaces_from_row(r)
+        lan_preview = _collect_lan_ifaces_from_vlans(vlans, exclude=wan_preview+["mgmt"])
+        link_preview = (r.get("vrrp_link_interface") or "").strip().lower() if (r.get("gateway_name_b") or "").strip() else ""
+        track_preview = ",".join(_unique_preserve([*wan_preview, *lan_preview]))
+        log.info(f"DRY: {site_name}: site-payload bytes={len(rendered)} (after inject: {len(_dumps(payload))})")
+        log.info(f"     VLANs: total={len(vlans)}; WAN-ifaces={wan_preview}; LAN-ifaces={lan_preview}")
+        if link_preview:
+            log.info(f"     VRRP preview (keys redacted): VRID={str(r.get('vrrp_vrid','16'))}, link='{link_preview}', track='{track_preview}'")
+        
+        # 7) ZPA Provisioning (Dry Run)
+        if str(r.get("appc_provision", "")).lower() in ("1", "true", "yes"):
+             base_root = API_V3.split("/api/v3")[0]
+             _flush_log()
+             zpa_provisioning.provision_zpa_for_site(r, session, base_root, cluster_id=99999, dry_run=True)
+
+        return True, site_name, "dry-run"
+
+    # 1) Create site (v3)
+    # FIX: Use 'payload' (rendered JSON) instead of 'r' (raw CSV row) to avoid 400 "Gateway details required"
+    ok_site, msg, cluster_hint = create_site(template_id, payload)
+    if not ok_site:
+        log.error(f"ERR : {site_name}: site create failed: {msg}")
+        return False, site_name, f"site create failed: {msg}"
+    log.info(f"OK  : {site_name}: site create → {msg[:160]}")
+
+    # 2) Resolve gateway ids + cluster (short poll)
+    gateways_str, cluster_id, site_row = resolve_gateway_ids_and_cluster(
+        site_name,
+        prefer_cluster_id=cluster_hint,
+        retries=POLL_RETRIES,
+    )
+    if not gateways_str or not cluster_id:
+        log.error(f"ERR : {site_name}: gateway/cluster not ready (gateways='{gateways_str}', cluster={cluster_id})")
+        return False, site_name, "gateway/cluster not ready"
+    if DEBUG:
+        log.debug(f"Gateways: {gateways_str}  Cluster: {cluster_id}")
+
+    # 3) VLANs were parsed above; report a missing/unreadable file once
+    if vlans_err:
+         log.warning(f"   ⚠️  Failed to load VLANs from {vlans_file}: {vlans_err}")
+
+    # Filled by the private-DNS lookup, else looked up on demand by the VLAN/VRRP steps
+    site_id: Optional[str] = None
+
+    # 4) Configure Private DNS (New Step)
+    private_dns = r.get("private_dns", "")
+    if private_dns:
+        # The gateway poll above returned this site's row, which normally carries the id already;
+        # otherwise back off (jittered, capped) and search for it again
+        existing = site_row
+        site_id = _extract_site_id(site_row) if site_row else None
+        t0 = time.monotonic()
+        for attempt in range(POLL_RETRIES):
+            if site_id:
+                break
+            existing = find_site_row_by_name(site_name)
+            site_id = _extract_site_id(existing) if existing else None
+            if site_id or time.monotonic() - t0 >= SITE_ID_MAX_WAIT_S:
+                break
+            _backoff_sleep(attempt)
+
+        if site_id:
+            configure_private_dns(session, API_V2, site_id, private_dns, dry_run=dry_run)
+        else:
+            log.warning(f"   ⚠️  Could not find site ID for Private DNS config (waited {time.monotonic() - t0:.1f}s)")
+            if existing:
+                log.info(f"       DEBUG: Found row keys: {list(existing.keys())}")
+
+    # 5) VLANs
+    if vlans_file and not vlans_err:
+        # process_vlans_for_site needs site_id
+        if not site_id:
+             existing = site_row or find_site_row_by_name(site_name)
+             site_id = _extract_site_id(existing) if existing else None
+        
+        if site_id:
+            process_vlans_for_site(session, API_V2, site_id, gateways_str, cluster_id, vlans, r, dry_run=dry_run)
+        else:
+            log.warning(f"   ⚠️  Skipping VLANs: site_id not found")
+
+    # 6) VRRP
+    if len(gateways_str.split(",")) > 1:
+        if not site_id:
+             existing = site_row or find_site_row_by_name(site_name)
+             site_id = _extract_site_id(existing) if existing else None
+        configure_vrrp(session, API_V2, gateways_str, cluster_id, vlans, r, site_id, dry_run=dry_run)
+
+    # 7) ZPA Provisioning
+    if str(r.get("appc_provision", "")).lower() in ("1", "true", "yes"):
+         base_root = API_V3.split("/api/v3")[0]
+         _flush_log()
+         zpa_provisioning.provision_zpa_for_site(r, session, base_root, cluster_id=cluster_id, dry_run=dry_run)
+
+    return True, site_name, "ok"
+
 def main():
-    global DEBUG
+    global DEBUG, REFRESH_TEMPLATES, VLAN_WORKERS, HTTP_POOL_MAXSIZE
     ap = argparse.ArgumentParser(description="Bulk create sites then add VLANs from vlans_file (via gateway_id + cluster_id)")
     ap.add_argument("--csv", default="sites.csv", help="Path to sites.csv")
     ap.add_argument("--dry-run", action="store_true", help="Render site payloads only; do not POST")
     ap.add_argument("--debug", action="store_true", help="Print each HTTP call and status code")
+    ap.add_argument("--concurrency", type=int, default=SITE_WORKERS, help=f"Sites processed in parallel (default {SITE_WORKERS}; output of parallel sites interleaves)")
+    ap.add_argument("--max-parallel", type=int, default=VLAN_WORKERS, help=f"Per-site parallel VLAN API calls (default {VLAN_WORKERS}; 1 = sequential)")
+    ap.add_argument("--refresh-templates", action="store_true", help="Refetch the template list when a template_name does not resolve")
     args = ap.parse_args()
     DEBUG = bool(args.debug)
+    log.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+    REFRESH_TEMPLATES = bool(args.refresh_templates)
+    VLAN_WORKERS = max(1, args.max_parallel)
 
     sites_path = pathlib.Path(args.csv)
     if not sites_path.exists():
         print(f"ERROR: {sites_path} not found", file=sys.stderr); sys.exit(1)
 
-    rows = read_csv_rows(sites_path)
-    todo = [r for r in rows if (r.get("post") or "").strip() == "1"]
+    todo = []
+    dupes = 0
+    seen: Set[str] = set()
+    for r in iter_csv_rows(sites_path):
+        if (r.get("post") or "").strip() != "1":
+            continue
+        # parallel workers would both see the site missing and create it twice: first row wins
+        key = (r.get("site_name") or "").strip().lower()
+        if key and key in seen:
+            log.warning(f"WARN: {(r.get('site_name') or '').strip()}: duplicate site_name in {sites_path}; row skipped")
+            dupes += 1
+            continue
+        seen.add(key)
+        todo.append(r)
     if not todo:
-        print("Nothing to do. Mark rows with post=1 in sites.csv."); return
+        log.info("Nothing to do. Mark rows with post=1 in sites.csv."); return
+
+    # Parse every referenced VLAN file up front (shared files are read once)
+    VLAN_CACHE.update(preload_vlans((r.get("vlans_file") or "").strip() for r in todo))
+
+    # Fetch the template list once up front if any row resolves by template_name
+    if any(not (r.get("template_id") or "").strip() for r in todo):
+        TEMPLATES._load()
 
-    print(f"Posting {len(todo)} site(s)…\n")
-    ok = 0; fail = 0
+    log.info(f"Posting {len(todo)} site(s)…\n")
+    ok = 0; fail = dupes
 
     # Initialize session
     # session is already global and initialized at top level
     if not session:
         print("Failed to login to ZTB", file=sys.stderr); sys.exit(1)
 
-    for r in todo:
-        site_name   = (r.get("site_name") or "").strip()
-        template_id = (r.get("template_id") or "").strip()
-        vlans_file  = (r.get("vlans_file") or "").strip()
-
-        if not site_name:
-            print("SKIP: row missing site_name"); fail += 1; continue
-
-        # Validate HA row consistency early
-        try:
-            validate_row_is_ha_consistent(r)
-        except SystemExit as e:
-            print(str(e)); fail += 1; continue
-
-        # Resolve template_id if missing (from template_name)
-        if not template_id:
-            ok_tid, resolved_tid, err = ensure_template_id_for_row(r)
-            if not ok_tid or not resolved_tid:
-                print(f"SKIP: {site_name}: {err}")
-                fail += 1; continue
-            template_id = resolved_tid
-            if DEBUG:
-                print(f"Resolved template_name='{r.get('template_name')}' -> template_id={template_id}")
-
-        # --- DHCP relay inference & validation (per-site) ---
-        dhcp_ip = (r.get("dhcp_server_ip") or "").strip()
-        svc = (r.get("dhcp_service_mode") or "").strip().lower()
-        if svc not in ("", "relay", "server", "inherit"):
-            svc = ""
-        if not svc and dhcp_ip:
-            svc = "relay"
-        if svc == "relay" and not dhcp_ip:
-            print(f"ERR : {site_name}: dhcp_service=relay requires dhcp_server_ip in sites.csv")
-            fail += 1; continue
-
-        # Jinja context
-        ctx = dict(r)
-        
-        # Resolve ZIA Location (if zia_location_name exists, try to find its ID)
-        zname = (r.get("zia_location_name") or "").strip()
-        existing_loc_id = None
-        if zname:
-            # We have a name, check if it exists in ZIA
-            existing_loc_id = ZIA_LOCATIONS.resolve(zname)
-            if existing_loc_id and DEBUG:
-                print(f"  Mapping zia_location_name='{zname}' -> existing_location_id={existing_loc_id}")
-                print(f"  INFO: Will use existing ZIA Location ID {existing_loc_id} ({zname})")
-            elif existing_loc_id:
-                # Always show this info even if not debug, since it changes behavior significantly
-                print(f"  INFO: Using existing ZIA Location ID {existing_loc_id} for '{zname}'")
-            elif zname and not existing_loc_id:
-                print(f"  WARN: zia_location_name='{zname}' not found in ZIA, will create NEW location.")
-
-        ctx["template_id"] = template_id
-        ctx["dhcp_service_mode"] = svc
-        if existing_loc_id:
-            ctx["existing_location_id"] = existing_loc_id
-
-        # Render site payload
-        try:
-            rendered = render_template(ctx)
-            payload  = json.loads(rendered)
-        except Exception as e:
-            print(f"ERR : {site_name}: template render failed: {e}")
-            fail += 1; continue
-
-        # Ensure DHCP keys as needed
-        if svc == "relay":
-            payload["dhcp_service"] = "relay"
-            payload["dhcp_server_ip"] = dhcp_ip
-        elif svc == "server":
-            payload["dhcp_service"] = "server"
-            payload.pop("dhcp_server_ip", None)
-
-        # If dry-run, preview and continue
-        if args.dry_run:
+    workers = max(1, min(args.concurrency, len(todo)))
+    # Re-size the pool for the flags: every site worker may run a full VLAN fan-out at once
+    HTTP_POOL_MAXSIZE = workers * VLAN_WORKERS
+    _mount_pool(session, HTTP_POOL_MAXSIZE)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = {ex.submit(process_site, r, args.dry_run): r for r in todo}
+        for f in as_completed(futures):
             try:
-                vlans = load_vlans(vlans_file) if vlans_file else []
+                site_ok, _, _ = f.result()
             except Exception as e:
-                vlans = []
-                print(f"    VLAN load warn: {e}")
-            wan_preview = _collect_wan_ifaces_from_row(r)
-            lan_preview = _collect_lan_ifaces_from_vlans(vlans, exclude=wan_preview+["mgmt"])
-            link_preview = (r.get("vrrp_link_interface") or "").strip().lower() if (r.get("gateway_name_b") or "").strip() else ""
-            track_preview = ",".join(_unique_preserve([*wan_preview, *lan_preview]))
-            print(f"DRY: {site_name}: site-payload bytes={len(rendered)} (after inject: {len(json.dumps(payload))})")
-            print(f"     VLANs: total={len(vlans)}; WAN-ifaces={wan_preview}; LAN-ifaces={lan_preview}")
-            if link_preview:
-                print(f"     VRRP preview (keys redacted): VRID={str(r.get('vrrp_vrid','16'))}, link='{link_preview}', track='{track_preview}'")
-            
-            # 7) ZPA Provisioning (Dry Run)
-            if str(r.get("appc_provision", "")).lower() in ("1", "true", "yes"):
-                 base_root = API_V3.split("/api/v3")[0]
-                 zpa_provisioning.provision_zpa_for_site(r, session, base_root, cluster_id=99999, dry_run=True)
-
-            ok += 1; continue
-
-        # 1) Create site (v3)
-        # FIX: Use 'payload' (rendered JSON) instead of 'r' (raw CSV row) to avoid 400 "Gateway details required"
-        ok_site, msg, cluster_hint = create_site(template_id, payload)
-        if not ok_site:
-            print(f"ERR : {site_name}: site create failed: {msg}")
-            fail += 1; continue
-        print(f"OK  : {site_name}: site create → {msg[:160]}")
-
-        # 2) Resolve gateway ids + cluster (short poll)
-        gateways_str, cluster_id = resolve_gateway_ids_and_cluster(
-            site_name,
-            prefer_cluster_id=cluster_hint,
-            retries=POLL_RETRIES,
-            delay=POLL_DELAY_S
-        )
-        if not gateways_str or not cluster_id:
-            print(f"ERR : {site_name}: gateway/cluster not ready (gateways='{gateways_str}', cluster={cluster_id})")
-            fail += 1; continue
-        if DEBUG:
-            print(f"Gateways: {gateways_str}  Cluster: {cluster_id}")
-
-        # 3) Load VLANs
-        # We just check existence here, actual loading is in process_vlans_for_site
-        if vlans_file and not os.path.exists(vlans_file):
-             print(f"   ⚠️  VLANs file not found: {vlans_file}")
-
-        # 4) Configure Private DNS (New Step)
-        private_dns = r.get("private_dns", "")
-        if private_dns:
-            # Retry lookup for site_id if not already found
-            site_id = None
-            # Increase retries to match polling duration
-            for i in range(10):
-                existing = find_site_row_by_name(site_name)
-                if existing:
-                    # Try multiple fields for site_id, similar to pull_site.py
-                    ci = existing.get("cluster_info") or {}
-                    site_id = ci.get("site_id") or existing.get("site_id") or existing.get("id")
-                    if site_id:
-                        break
-                if i < 9: time.sleep(2)
-
-            if site_id:
-                configure_private_dns(session, API_V2, site_id, private_dns, dry_run=args.dry_run)
+                log.error(f"ERR : {(futures[f].get('site_name') or '').strip()}: {e}")
+                site_ok = False
+            if site_ok:
+                ok += 1
             else:
-                print(f"   ⚠️  Could not find site ID for Private DNS config (checked 10x)")
-                if existing:
-                    print(f"       DEBUG: Found row keys: {list(existing.keys())}")
-
-        # 5) VLANs
-        if vlans_file and os.path.exists(vlans_file):
-            # We need site_id for process_vlans_for_site?
-            # process_vlans_for_site signature: (session, api_v2, site_id, gw_ids, cluster_id, vlans_file, row, dry_run)
-            # We need site_id.
-            if not locals().get("site_id"):
-                 existing = find_site_row_by_name(site_name)
-                 site_id = existing.get("id") if existing else None
-            
-            if site_id:
-                process_vlans_for_site(session, API_V2, site_id, gateways_str, cluster_id, vlans_file, r, dry_run=args.dry_run)
-            else:
-                print(f"   ⚠️  Skipping VLANs: site_id not found")
-
-        # 6) VRRP
-        if len(gateways_str.split(",")) > 1:
-            if not locals().get("site_id"):
-                 existing = find_site_row_by_name(site_name)
-                 site_id = existing.get("id") if existing else None
-            configure_vrrp(session, API_V2, gateways_str, cluster_id, vlans_file, r, site_id, dry_run=args.dry_run)
-
-        # 7) ZPA Provisioning
-        if str(r.get("appc_provision", "")).lower() in ("1", "true", "yes"):
-             base_root = API_V3.split("/api/v3")[0]
-             zpa_provisioning.provision_zpa_for_site(r, session, base_root, cluster_id=cluster_id, dry_run=args.dry_run)
+                fail += 1
 
-    print("\nDone.")
+    log.info(f"\nDone. OK={ok} ERR={fail}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -12,6 +12,8 @@
 #   python3 pull_site.py --site-name "Utrecht-Branch" --json-only
 #   python3 pull_site.py --site-name "Utrecht-Branch" --include-ha
 #   python3 pull_site.py --list-templates [--template-search "zt800"]
+#   python3 pull_site.py --all-sites [--workers 8]                 # every site, fetched concurrently
+#   python3 pull_site.py --site-name "Utrecht-Branch" --no-cache     # bypass .cache/ listings
 #
 # Notes:
 #   - Saves VLAN definitions to vlans/<site>.json and vlans/<site>.csv
@@ -26,13 +28,23 @@
 #                   bulk_create resolves ID from template_name at runtime.
 #
 #   - **Auth QoL (single-run)**:
-#       · If BEARER is missing, we call `ztb_login.py`, reload .env, and build the session with the new token.
-#       · If any request returns 401 once, we call `ztb_login.py`, update the session header, and retry ONCE.
+#       · If BEARER is missing, we call `ztb_login` in-process (it updates .env) and build the session with the new token.
+#       · If any request returns 401 once, we call `ztb_login`, update the session header, and retry ONCE.
 #       · Messages are visible (no hidden background behavior).
 
-import os, sys, json, csv, argparse, pathlib, subprocess
-from typing import Any, Dict, List, Optional, Tuple
+import os, sys, json, csv, argparse, pathlib, atexit, threading, time, difflib, hashlib, contextlib, functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import ztb_login
+
+# Optional: orjson for faster JSON encode/decode (falls back to stdlib json)
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
 
 # ------------------------
 # Paths
@@ -41,7 +53,18 @@ ROOT = pathlib.Path(__file__).resolve().parent
 OUT_VLANS_DIR = ROOT / "vlans"
 OUT_VLANS_DIR.mkdir(exist_ok=True)
 CSV_PATH = ROOT / "sites.csv"
-LOGIN_SCRIPT = ROOT / "ztb_login.py"
+
+# Keep-alive pool shared by every call in the run
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 32
+
+# /Gateway paging (stop on a short page; the cap guards against a server that ignores "page")
+GATEWAY_PAGE_SIZE = 200
+GATEWAY_MAX_PAGES = 50
+
+# On-disk cache for listings that rarely change (templates, gateway list), shared across runs.
+# Entries are per tenant; ZTB_CACHE_TTL=0 (env or .env) or --no-cache turns it off.
+CACHE_DIR = ROOT / ".cache"
 
 # ------------------------
 # tiny .env loader (no extra deps)
@@ -61,10 +84,13 @@ def load_env_file(path: str = ".env"):
         os.environ[k] = v
 
 load_env_file(".env")
+# read after .env so a ZTB_CACHE_TTL set there applies
+CACHE_TTL_S = float(os.getenv("ZTB_CACHE_TTL") or 300)
 
 # ------------------------
 # Env / session
 # ------------------------
+@functools.lru_cache(maxsize=4)
 def _normalize_base_root(raw: str) -> str:
     """Accept root or /api/v3|v2 and return clean ROOT (no trailing slash, no /api/*)."""
     base = (raw or "").strip().rstrip("/")
@@ -73,33 +99,41 @@ def _normalize_base_root(raw: str) -> str:
     return base
 
 def _invoke_login() -> bool:
-    """Run ztb_login.py and reload .env. Return True if BEARER is now set."""
-    if not LOGIN_SCRIPT.exists():
-        print("ERROR: ztb_login.py not found; cannot auto-fetch token.", file=sys.stderr)
-        return False
-    print("🔐 BEARER missing — invoking ztb_login.py to obtain a fresh token…")
+    """Run ztb_login in-process (it still updates .env). Return True if BEARER is now set."""
+    print("🔐 BEARER missing — invoking ztb_login to obtain a fresh token…")
     try:
-        # visible to user
-        subprocess.run([sys.executable, str(LOGIN_SCRIPT)], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"ERROR: ztb_login.py failed with exit code {e.returncode}", file=sys.stderr)
+        # visible to user; the token comes back directly, no .env re-read needed
+        token, _ = ztb_login.ztb_login(write_env=True, quiet=False)
+    except SystemExit as e:
+        print(f"ERROR: ztb_login failed: {e}", file=sys.stderr)
         return False
-    # reload env so we get the new token immediately
-    load_env_file(".env")
-    return bool((os.environ.get("BEARER") or "").strip())
+    token = (token or "").strip()
+    if token:
+        os.environ["BEARER"] = token
+    return bool(token)
+
+# Concurrent GETs can 401 together; only the first runs the login, the rest reuse its token
+_REFRESH_LOCK = threading.Lock()
+_LAST_REFRESH_TS = float("-inf")
+REFRESH_DEDUP_S = 5.0
 
 def _refresh_bearer_and_update_session(session: requests.Session) -> bool:
     """On 401: run login, reload env, update session header."""
-    print("🔄 401 Unauthorized — refreshing token via ztb_login.py and retrying once…")
-    if not _invoke_login():
-        print("ERROR: token refresh failed.", file=sys.stderr)
-        return False
-    new_bearer = (os.environ.get("BEARER") or "").strip()
-    if not new_bearer:
-        print("ERROR: ztb_login.py ran but BEARER is still empty.", file=sys.stderr)
-        return False
-    session.headers["Authorization"] = f"Bearer {new_bearer}"
-    return True
+    global _LAST_REFRESH_TS
+    with _REFRESH_LOCK:
+        if time.monotonic() - _LAST_REFRESH_TS < REFRESH_DEDUP_S:
+            return True  # another thread just refreshed
+        print("🔄 401 Unauthorized — refreshing token via ztb_login and retrying once…")
+        if not _invoke_login():
+            print("ERROR: token refresh failed.", file=sys.stderr)
+            return False
+        new_bearer = (os.environ.get("BEARER") or "").strip()
+        if not new_bearer:
+            print("ERROR: ztb_login ran but BEARER is still empty.", file=sys.stderr)
+            return False
+        session.headers["Authorization"] = f"Bearer {new_bearer}"
+        _LAST_REFRESH_TS = time.monotonic()
+        return True
 
 def get_session_and_bases():
     # Prefer ZTB_API_BASE, fallback to legacy ZIA_API_BASE
@@ -112,7 +146,7 @@ def get_session_and_bases():
     # Ensure a bearer exists BEFORE creating the session header
     if not (os.environ.get("BEARER") or "").strip():
         if not _invoke_login():
-            print("ERROR: BEARER still missing after ztb_login.py.", file=sys.stderr)
+            print("ERROR: BEARER still missing after ztb_login.", file=sys.stderr)
             sys.exit(1)
 
     bearer = (os.environ.get("BEARER") or "").strip()
@@ -130,65 +164,173 @@ def get_session_and_bases():
         "Authorization": f"Bearer {bearer}",  # BEARER here is already ensured/fresh
         "Accept": "application/json",
         "User-Agent": "pull_site.py",
+        "Connection": "keep-alive",
     })
+    # One TLS connection reused across the Gateway/Network/templates calls, plus
+    # transient-error retries (429/5xx) on GETs only, like bulk_create / zpa_provisioning (a POST
+    # that already committed must not be re-sent); raise_on_status=False keeps the status visible to callers
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+        ),
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    atexit.register(s.close)
 
     return s, base_v3, base_v2, origin_host, referer
 
-session, BASE_V3, BASE_V2, ORIGIN, REFERER = get_session_and_bases()
+# Built on first API use, so --help and argument errors never trigger a login
+_SESSION_CTX: Optional[Tuple[requests.Session, str, str, str, str]] = None
+_SESSION_LOCK = threading.Lock()
+
+def _ctx() -> Tuple[requests.Session, str, str, str, str]:
+    """(session, BASE_V3, BASE_V2, ORIGIN, REFERER), created once."""
+    global _SESSION_CTX
+    if _SESSION_CTX is None:
+        with _SESSION_LOCK:
+            if _SESSION_CTX is None:
+                _SESSION_CTX = get_session_and_bases()
+    return _SESSION_CTX
 
 # ------------------------
 # HTTP helpers (with single-run 401 refresh)
 # ------------------------
 def _request_with_auto_refresh(method: str, url: str, *, params=None, headers=None, timeout=60, json=None, data=None):
+    session = _ctx()[0]
     r = session.request(method, url, params=params, headers=headers, timeout=timeout, json=json, data=data)
     if r.status_code == 401:
         if _refresh_bearer_and_update_session(session):
             r = session.request(method, url, params=params, headers=headers, timeout=timeout, json=json, data=data)
     return r
 
-def get_json(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Any:
+def get_json_etag(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None, etag: Optional[str] = None) -> Tuple[Any, Optional[str]]:
+    """Conditional GET: (None, etag) on 304 Not Modified, else (parsed body, response ETag)."""
+    if etag:
+        headers = {**(headers or {}), "If-None-Match": etag}
     r = _request_with_auto_refresh("GET", url, params=params, headers=headers, timeout=60)
+    if etag and r.status_code == 304:
+        return None, etag
     if r.status_code != 200:
         raise RuntimeError(f"GET {url} -> {r.status_code} {r.text[:300]}")
     try:
-        return r.json()
+        data = orjson.loads(r.content) if orjson is not None else r.json()
     except Exception:
         raise ValueError(f"Non-JSON response from {url}: {r.text[:300]}")
+    return data, r.headers.get("ETag")
+
+def get_json(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Any:
+    return get_json_etag(url, params=params, headers=headers)[0]
 
 def get_json_v3(path: str, params: Optional[Dict[str, Any]] = None) -> Any:
     # Many v3 endpoints prefer the trailing slash (Gateway/ vs Gateway)
     p = path.lstrip("/")
     if not p.endswith("/"):
         p += "/"
+    _, base_v3, _, origin, referer = _ctx()
     headers = {
         "Accept": "application/json, text/plain, */*",
-        "Origin": ORIGIN,
-        "Referer": REFERER,
+        "Origin": origin,
+        "Referer": referer,
         "X-Requested-With": "XMLHttpRequest",
     }
-    return get_json(f"{BASE_V3}/{p}", params=params, headers=headers)
+    return get_json(f"{base_v3}/{p}", params=params, headers=headers)
 
-def get_json_v3_no_trailing(path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+def get_json_v3_no_trailing(path: str, params: Optional[Dict[str, Any]] = None, etag: Optional[str] = None) -> Tuple[Any, Optional[str]]:
     # Some endpoints (e.g., /templates) are 404-sensitive to a trailing slash.
+    # Returns (data, etag) like get_json_etag.
     p = path.lstrip("/")
+    _, base_v3, _, origin, referer = _ctx()
     headers = {
         "Accept": "application/json, text/plain, */*",
-        "Origin": ORIGIN,
-        "Referer": REFERER,
+        "Origin": origin,
+        "Referer": referer,
         "X-Requested-With": "XMLHttpRequest",
     }
-    return get_json(f"{BASE_V3}/{p}", params=params, headers=headers)
+    return get_json_etag(f"{base_v3}/{p}", params=params, headers=headers, etag=etag)
+
+# ------------------------
+# Atomic file writes: write a sibling .tmp, then os.replace() it over the target,
+# so a crash mid-write never leaves a truncated CSV/JSON behind
+# ------------------------
+@contextlib.contextmanager
+def _atomic_open(path: pathlib.Path, mode: str = "w"):
+    # per process+thread temp name: concurrent writers of one target never share (or unlink) a temp
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    kw = {} if "b" in mode else {"newline": "", "encoding": "utf-8"}
+    try:
+        with open(tmp, mode, **kw) as f:
+            yield f
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+# ------------------------
+# Disk cache (TTL, revalidated with ETag when the server sends one)
+# ------------------------
+def _cache_paths(key: str) -> Tuple[pathlib.Path, pathlib.Path]:
+    base = _normalize_base_root(os.environ.get("ZTB_API_BASE") or os.environ.get("ZIA_API_BASE") or "")
+    tenant = hashlib.sha1(base.encode("utf-8")).hexdigest()[:12]
+    return CACHE_DIR / f"{key}-{tenant}.json", CACHE_DIR / f"{key}-{tenant}.meta"
+
+def _cache_read(key: str) -> Tuple[Any, Dict[str, Any]]:
+    body, meta = _cache_paths(key)
+    try:
+        return json.loads(body.read_text(encoding="utf-8")), json.loads(meta.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None, {}
+
+def _cache_write(key: str, data: Any, etag: Optional[str]):
+    body, meta = _cache_paths(key)
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        for path, obj in ((body, data), (meta, {"ts": time.time(), "etag": etag})):
+            with _atomic_open(path) as f:
+                f.write(json.dumps(obj))
+    except OSError:
+        pass  # cache is best-effort
+
+def _cache_peek(key: str) -> Any:
+    """Cached value if still within the TTL, else None (never touches the network)."""
+    if CACHE_TTL_S <= 0:
+        return None
+    data, meta = _cache_read(key)
+    if data is not None and time.time() - float(meta.get("ts") or 0) < CACHE_TTL_S:
+        return data
+    return None
+
+def _cached_get(key: str, fn) -> Any:
+    """fn(etag) -> (data, etag); data None means 304, i.e. the cached copy is still current."""
+    if CACHE_TTL_S <= 0:
+        return fn(None)[0]
+    hit = _cache_peek(key)
+    if hit is not None:
+        return hit
+    cached, meta = _cache_read(key)
+    data, etag = fn(meta.get("etag") if cached is not None else None)
+    if data is None:
+        data = cached
+    _cache_write(key, data, etag)
+    return data
 
 def get_vlans_v2_network(site_id: str) -> List[Dict[str, Any]]:
     """
     VLANs via /api/v2/Network/?siteId=...
     """
-    url = f"{BASE_V2}/Network/"
+    _, _, base_v2, origin, referer = _ctx()
+    url = f"{base_v2}/Network/"
     params = {"siteId": site_id, "refresh_token": "enabled"}
     headers = {
         "Accept": "application/json, text/plain, */*",
-        "Origin": ORIGIN,
-        "Referer": REFERER,
+        "Origin": origin,
+        "Referer": referer,
     }
     data = get_json(url, params=params, headers=headers)
     # Normalize: {result:{rows:[...]}} OR {rows:[...]} OR [...]
@@ -202,14 +344,14 @@ def get_vlans_v2_network(site_id: str) -> List[Dict[str, Any]]:
 # ------------------------
 # Data access
 # ------------------------
-def list_gateways_rows() -> List[Dict[str, Any]]:
+def _gateway_page(page: int, page_size: int) -> List[Dict[str, Any]]:
     data = get_json_v3("Gateway", params={
         "gateway_type": "isolation",
         "sortdir": "asc",
         "sort": "location",
         "search": "",
-        "page": 0,
-        "limit": "100",
+        "page": page,
+        "limit": str(page_size),
         "refresh_token": "enabled",
     })
     if isinstance(data, dict):
@@ -219,6 +361,22 @@ def list_gateways_rows() -> List[Dict[str, Any]]:
             return data["result"]["rows"]
     raise ValueError("Unexpected /Gateway response; could not find rows list.")
 
+def iter_gateway_rows(page_size: int = GATEWAY_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield /Gateway rows page by page; a consumer that stops early stops the paging too."""
+    prev: Optional[List[Dict[str, Any]]] = None
+    for page in range(GATEWAY_MAX_PAGES):
+        batch = _gateway_page(page, page_size)
+        if batch == prev:  # server ignored "page"; don't loop on the same rows
+            return
+        yield from batch
+        if len(batch) < page_size:
+            return
+        prev = batch
+
+def list_gateways_rows() -> List[Dict[str, Any]]:
+    # paged, so no single ETag: TTL only
+    return _cached_get("gateways", lambda _etag: (list(iter_gateway_rows()), None))
+
 # ---- Templates API (no trailing slash) ----
 def fetch_templates(search: str = "") -> List[Dict[str, Any]]:
     params = {
@@ -229,7 +387,11 @@ def fetch_templates(search: str = "") -> List[Dict[str, Any]]:
         "page": 0,
         "refresh_token": "enabled",
     }
-    data = get_json_v3_no_trailing("templates", params=params)
+    if search:
+        data, _ = get_json_v3_no_trailing("templates", params=params)
+    else:
+        # the unfiltered list is what repeat runs ask for; cache it
+        data = _cached_get("templates", lambda etag: get_json_v3_no_trailing("templates", params=params, etag=etag))
     if isinstance(data, dict):
         if isinstance(data.get("result"), list):
             return data["result"]
@@ -260,7 +422,7 @@ def fetch_locations() -> List[Dict[str, Any]]:
         "no_cache": "true",
         "refresh_token": "enabled",
     }
-    data = get_json_v3_no_trailing("settings/locations", params=params)
+    data, _ = get_json_v3_no_trailing("settings/locations", params=params)
     if isinstance(data, dict):
         return data.get("locations", [])
     return []
@@ -288,14 +450,23 @@ def print_site_list(rows: List[Dict[str, Any]]):
     print("-" * 60)
     print('Run: python3 pull_site.py --site-name "Utrecht-Branch"')
 
-def match_row_by_name(rows: List[Dict[str, Any]], site_name: str) -> Optional[Dict[str, Any]]:
+SITE_NAME_FIELDS = ("location_display_name", "site_name", "zia_location_name", "name", "location")
+
+def match_row_by_name(rows: Iterable[Dict[str, Any]], site_name: str, index: Optional[Dict[str, Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
+    """First row whose name fields match (case-insensitive). Rows are indexed into `index`
+    ({normalized name: first row}) as they stream in, so it can be reused for more lookups
+    or close-match hints; already-indexed names are answered without touching `rows`."""
     wanted = site_name.strip().lower()
-    fields = ["location_display_name", "site_name", "zia_location_name", "name", "location"]
+    idx = {} if index is None else index
+    if wanted in idx:
+        return idx[wanted]
     for r in rows:
-        for f in fields:
+        for f in SITE_NAME_FIELDS:
             v = r.get(f)
-            if isinstance(v, str) and v.strip().lower() == wanted:
-                return r
+            if isinstance(v, str):
+                idx.setdefault(v.strip().lower(), r)
+        if wanted in idx:
+            return idx[wanted]
     return None
 
 # ------------------------
@@ -329,48 +500,33 @@ def _map_dhcp_service_for_csv(raw: Optional[str]) -> str:
         return "non-airgapped"
     return raw
 
-def vlans_to_csv_rows(vlans: List[Dict[str, Any]]) -> List[Dict[str, str]]:
-    out: List[Dict[str, str]] = []
-    for v in vlans:
-        name   = (v.get("display_name") or v.get("name") or "").strip()
-        tag    = str(v.get("tag") or "").strip()
-        subnet = str(v.get("subnet") or "").strip()
-        iface  = (v.get("interface") or "").strip()
-        zone   = (v.get("zone") or "").strip()
-
-        gw = (v.get("default_gateway") or "").strip()
-        if not gw:
-            gw = (v.get("start_ip") or "").strip()
-            if not gw:
-                a, _ = _split_range(v)
-                gw = a
-
-        dhcp_start, dhcp_end = _split_range(v)
-        status = (v.get("status") or "").strip().lower()
-        enabled = "TRUE" if status == "provisioned" else "FALSE"
-        share_over_vpn = "TRUE" if bool(v.get("share_over_vpn", False)) else "FALSE"
-        dhcp_service_disp = _map_dhcp_service_for_csv(v.get("dhcp_service"))
-
-        out.append({
-            "name": name,
-            "tag": tag,
-            "subnet": subnet,
-            "default_gateway": gw,
-            "dhcp_start": dhcp_start,
-            "dhcp_end": dhcp_end,
-            "interface": iface,
-            "zone": zone,
-            "enabled": enabled,
-            "share_over_vpn": share_over_vpn,
-            "dhcp_service": dhcp_service_disp,
-        })
-    return out
-
-def write_vlans_csv(vlans: List[Dict[str, Any]], path: pathlib.Path):
-    rows = vlans_to_csv_rows(vlans)
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=VLAN_CSV_FIELDS)
-        w.writeheader()
+def vlan_to_csv_row(v: Dict[str, Any]) -> List[str]:
+    # list in VLAN_CSV_FIELDS order (plain csv.writer, no per-cell dict lookups)
+    get = v.get
+    name   = (get("display_name") or get("name") or "").strip()
+    tag    = str(get("tag") or "").strip()
+    subnet = str(get("subnet") or "").strip()
+    iface  = (get("interface") or "").strip()
+    zone   = (get("zone") or "").strip()
+
+    # range split once; its start doubles as the gateway fallback
+    dhcp_start, dhcp_end = _split_range(v)
+    gw = (get("default_gateway") or "").strip() or (get("start_ip") or "").strip() or dhcp_start
+
+    status = (get("status") or "").strip().lower()
+    enabled = "TRUE" if status == "provisioned" else "FALSE"
+    share_over_vpn = "TRUE" if bool(get("share_over_vpn", False)) else "FALSE"
+    dhcp_service_disp = _map_dhcp_service_for_csv(get("dhcp_service"))
+
+    return [
+        name, tag, subnet, gw, dhcp_start, dhcp_end,
+        iface, zone, enabled, share_over_vpn, dhcp_service_disp,
+    ]
+
+def write_vlan_csv_rows(rows: List[List[str]], path: pathlib.Path):
+    with _atomic_open(path) as f:
+        w = csv.writer(f)
+        w.writerow(VLAN_CSV_FIELDS)
         w.writerows(rows)
 
 # ------------------------
@@ -390,56 +546,94 @@ def ensure_sites_csv_header():
     if not CSV_PATH.exists():
         CSV_PATH.write_text(CSV_HEADER, encoding="utf-8")
 
-def upsert_sites_csv_row(row: Dict[str, str]):
-    ensure_sites_csv_header()
-    existing: List[Dict[str, str]] = []
-    if CSV_PATH.exists():
-        with open(CSV_PATH, newline="", encoding="utf-8") as f:
-            existing = list(csv.DictReader(f))
+# sites.csv is parsed once per run and kept as {lowercased site_name: row}; upserts only
+# touch the dict and the file is rewritten once at exit (if anything changed)
+_SITES_CACHE: Optional[Dict[str, Dict[str, str]]] = None
+_SITES_FIELDS: List[str] = []
+_SITES_DIRTY = False
 
-    out: List[Dict[str, str]] = []
-    seen = False
-    for r in existing:
-        if r.get("site_name", "").strip().lower() == row["site_name"].strip().lower():
-            out.append(row); seen = True
-        else:
-            out.append(r)
-    if not seen:
-        out.append(row)
+def _site_key(name: str) -> str:
+    return (name or "").strip().lower()
 
-    with open(CSV_PATH, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=list(out[0].keys()))
+def _load_sites_cache() -> Dict[str, Dict[str, str]]:
+    global _SITES_CACHE, _SITES_FIELDS
+    if _SITES_CACHE is None:
+        ensure_sites_csv_header()
+        cache: Dict[str, Dict[str, str]] = {}
+        with open(CSV_PATH, newline="", encoding="utf-8") as f:
+            rd = csv.DictReader(f)
+            _SITES_FIELDS = list(rd.fieldnames or [])
+            for i, r in enumerate(rd):
+                k = _site_key(r.get("site_name", ""))
+                # unnamed/duplicate rows are kept as-is under a unique key
+                cache[k if k and k not in cache else f"{k}\0{i}"] = r
+        _SITES_CACHE = cache
+        atexit.register(_flush_sites_cache)
+    return _SITES_CACHE
+
+def _flush_sites_cache():
+    global _SITES_DIRTY
+    if not _SITES_DIRTY or _SITES_CACHE is None:
+        return
+    rows = list(_SITES_CACHE.values())
+    fields = list(_SITES_FIELDS)
+    for r in rows:
+        fields.extend(k for k in r if k not in fields)
+    with _atomic_open(CSV_PATH) as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
         writer.writeheader()
-        writer.writerows(out)
+        writer.writerows(rows)
+    _SITES_DIRTY = False
+
+def upsert_sites_csv_row(row: Dict[str, str]):
+    global _SITES_DIRTY
+    _load_sites_cache()[_site_key(row["site_name"])] = row
+    _SITES_DIRTY = True
 
 # ------------------------
 # helpers
 # ------------------------
-def is_wan_vlan(v: Dict[str, Any]) -> bool:
-    zone = (v.get("zone") or "").strip().lower()
-    if zone.startswith("wan"):
-        return True
-    name = (v.get("display_name") or v.get("name") or "").strip().lower()
-    if name.startswith("wan"):
-        return True
-    return False
+def _vlan_filter_keys(v: Dict[str, Any]) -> Tuple[str, str, str]:
+    # (zone, name, tag) normalized once per VLAN for the WAN/HA predicates
+    return (
+        (v.get("zone") or "").strip().lower(),
+        (v.get("display_name") or v.get("name") or "").strip().lower(),
+        str(v.get("tag") or "").strip(),
+    )
 
-def is_ha_internal_vlan(v: Dict[str, Any]) -> bool:
-    zone = (v.get("zone") or "").strip().lower()
-    if zone.startswith("ha"):
-        return True
-    name = (v.get("display_name") or v.get("name") or "").strip().lower()
-    tag  = str(v.get("tag") or "").strip()
-    if name.startswith("ha-") and tag == "1":
-        return True
-    return False
+# str.startswith takes a tuple: add prefixes here rather than more checks
+_WAN_PREFIXES = ("wan",)
+_HA_ZONE_PREFIXES = ("ha",)
+_HA_NAME_PREFIXES = ("ha-",)
+
+def _is_wan(zone: str, name: str) -> bool:
+    return zone.startswith(_WAN_PREFIXES) or name.startswith(_WAN_PREFIXES)
+
+def _is_ha_internal(zone: str, name: str, tag: str) -> bool:
+    return zone.startswith(_HA_ZONE_PREFIXES) or (tag == "1" and name.startswith(_HA_NAME_PREFIXES))
+
+def process_vlans(vlans_all: List[Dict[str, Any]], include_wan: bool, include_ha: bool) -> Tuple[List[List[str]], bool]:
+    """Filter and convert in one pass: (CSV rows for the kept VLANs, whether the view is filtered)."""
+    rows: List[List[str]] = []
+    filtered = not include_wan
+    for v in vlans_all:
+        # zone/name/tag normalized once for both predicates
+        zone, name, tag = _vlan_filter_keys(v)
+        if not include_wan and _is_wan(zone, name):
+            continue
+        if not include_ha and _is_ha_internal(zone, name, tag):
+            filtered = True
+            continue
+        rows.append(vlan_to_csv_row(v))
+    return rows, filtered
 
 def get_private_dns_members(site_id: str) -> str:
     """
     Fetch Private DNS members for the site from System-Private-DNS-Servers-Group.
     Returns comma-separated list of IPs (without /32).
     """
-    url = f"{BASE_V2}/group-membership"
+    _, _, base_v2, origin, referer = _ctx()
+    url = f"{base_v2}/group-membership"
     params = {
         "site_id": site_id,
         "group_name": "System-Private-DNS-Servers-Group",
@@ -447,8 +641,8 @@ def get_private_dns_members(site_id: str) -> str:
     }
     headers = {
         "Accept": "application/json, text/plain, */*",
-        "Origin": ORIGIN,
-        "Referer": REFERER,
+        "Origin": origin,
+        "Referer": referer,
     }
     
     try:
@@ -467,76 +661,40 @@ def get_private_dns_members(site_id: str) -> str:
     return ""
 
 # ------------------------
-# Main
+# Pull
 # ------------------------
-def main():
-    ap = argparse.ArgumentParser(
-        description="List sites OR pull one by name; saves VLANs (JSON+CSV) and updates sites.csv"
-    )
-    ap.add_argument("--site-name", help="Human site name from the UI (e.g. 'Utrecht-Branch')")
-    ap.add_argument("--json-only", action="store_true", help="Skip writing VLAN CSV")
-    ap.add_argument("--include-wan", action="store_true", help="Include WAN VLANs in the CSV (default: excluded)")
-    ap.add_argument("--include-ha", action="store_true", help="Include HA internal VLAN(s) in the CSV (default: excluded)")
-    ap.add_argument("--list-templates", action="store_true", help="List templates (name, deployment_type, platform_type, id)")
-    ap.add_argument("--template-search", default="", help="Optional name filter for --list-templates (uses API 'search' param)")
-    ap.add_argument("--list-locations", action="store_true", help="List ZIA locations (name, id)")
-    args = ap.parse_args()
-
-    # Handle location listing early-out
-    if args.list_locations:
-        locs = fetch_locations()
-        print_locations(locs)
-        return
-
-    # Handle template listing early-out
-    if args.list_templates:
-        tpls = fetch_templates(args.template_search)
-        print_templates(tpls)
-        return
-
-    rows = list_gateways_rows()
-
-    # If no site name, list sites and exit
-    if not args.site_name:
-        print_site_list(rows)
-        return
-
-    row = match_row_by_name(rows, args.site_name)
-    if not row:
-        print(f"ERROR: site not found: {args.site_name}", file=sys.stderr)
-        sys.exit(1)
-
+def pull_one_site(site_name: str, row: Dict[str, Any], *, include_wan: bool = False, include_ha: bool = False, json_only: bool = False) -> Dict[str, str]:
+    """Save one site's VLANs (JSON + filtered CSV) and return its sites.csv row."""
     # Resolve site_id for v2/Network
     ci = row.get("cluster_info") or {}
     site_id = ci.get("site_id") or row.get("site_id") or row.get("id")
     if not site_id:
-        print("ERROR: Unable to resolve site_id for v2/Network.", file=sys.stderr)
-        sys.exit(1)
-
-    # VLANs
-    vlans_all = get_vlans_v2_network(str(site_id))
-    vlan_json_path = OUT_VLANS_DIR / f"{args.site_name}.json"
-    vlan_json_path.write_text(json.dumps(vlans_all, indent=2) + "\n", encoding="utf-8")
+        raise RuntimeError("Unable to resolve site_id for v2/Network.")
+
+    # VLANs and Private DNS members are independent GETs keyed by site_id: overlap them
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_vlans = ex.submit(get_vlans_v2_network, str(site_id))
+        f_dns = ex.submit(get_private_dns_members, str(site_id))
+        vlans_all = f_vlans.result()
+        private_dns_ips = f_dns.result()
+
+    vlan_json_path = OUT_VLANS_DIR / f"{site_name}.json"
+    with _atomic_open(vlan_json_path, "wb") as f:
+        if orjson is not None:
+            f.write(orjson.dumps(vlans_all, option=orjson.OPT_INDENT_2) + b"\n")
+        else:
+            f.write((json.dumps(vlans_all, indent=2) + "\n").encode("utf-8"))
     print(f"Saved VLANs JSON: {vlan_json_path} (count={len(vlans_all)})")
 
     # CSV is filtered view:
-    vlans = vlans_all
-    filtered = False
-    if not args.include_wan:
-        vlans = [v for v in vlans if not is_wan_vlan(v)]
-        filtered = True
-    if not args.include_ha:
-        before = len(vlans)
-        vlans = [v for v in vlans if not is_ha_internal_vlan(v)]
-        if len(vlans) != before:
-            filtered = True
+    csv_rows, filtered = process_vlans(vlans_all, include_wan, include_ha)
 
     if filtered:
-        print(f"Filtered CSV view. WAN included={args.include_wan}, HA included={args.include_ha}. CSV count={len(vlans)}")
+        print(f"Filtered CSV view. WAN included={include_wan}, HA included={include_ha}. CSV count={len(csv_rows)}")
 
-    if not args.json_only:
-        vlan_csv_path = OUT_VLANS_DIR / f"{args.site_name}.csv"
-        write_vlans_csv(vlans, vlan_csv_path)
+    if not json_only:
+        vlan_csv_path = OUT_VLANS_DIR / f"{site_name}.csv"
+        write_vlan_csv_rows(csv_rows, vlan_csv_path)
         print(f"Saved VLANs CSV : {vlan_csv_path}")
 
     # --- Extract per-node WAN fields (supports standalone or HA) ---
@@ -557,12 +715,9 @@ def main():
     wan1_gw   = gw_b.get("default_gw_ip", "")
     wan1_if   = gw_b.get("wan_interface", "")
 
-    # Fetch Private DNS
-    private_dns_ips = get_private_dns_members(str(site_id))
-
     # sites.csv row (defaults you can edit before bulk_create) — leave template_id BLANK on purpose
     csv_row = {
-        "site_name":           args.site_name,
+        "site_name":           site_name,
         "gateway_name":        gateway_name_a,
         "gateway_name_b":      gateway_name_b,
 
@@ -581,16 +736,111 @@ def main():
         "wan_dns":             ci.get("per_site_dns","") or row.get("per_site_dns",""),
         "private_dns":         private_dns_ips,
         "dhcp_server_ip":      ci.get("dhcp_server_ip","") or row.get("dhcp_server_ip",""),
-        "zia_location_name":   row.get("zia_location_name","") or row.get("location_display_name","") or args.site_name,
+        "zia_location_name":   row.get("zia_location_name","") or row.get("location_display_name","") or site_name,
 
         "wan_interface_name":  wan0_if,
         "wan1_interface_name": wan1_if,
 
-        "vlans_file":          (OUT_VLANS_DIR / f"{args.site_name}.csv").as_posix(),
+        "vlans_file":          (OUT_VLANS_DIR / f"{site_name}.csv").as_posix(),
         "post":                "0",
         "appc_provision":      "0",
     }
 
+    return csv_row
+
+def _row_site_name(r: Dict[str, Any]) -> str:
+    for f in ("location_display_name", "site_name", "location"):
+        v = r.get(f)
+        if isinstance(v, str) and v.strip():
+            return v.strip()
+    return ""
+
+def pull_all_sites(*, workers: int, include_wan: bool, include_ha: bool, json_only: bool) -> int:
+    """Pull every listed site concurrently over the pooled session; returns the failure count."""
+    # Live list, never the disk cache: these rows are written into sites.csv.
+    # One pull per site (first row wins, keyed like sites.csv rows): rows sharing a name
+    # would write the same vlans/<name>.* files
+    by_key: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+    for r in iter_gateway_rows():
+        n = _row_site_name(r)
+        if n:
+            by_key.setdefault(_site_key(n), (n, r))
+    targets = list(by_key.values())
+    fail = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(targets) or 1))) as ex:
+        futs = {ex.submit(pull_one_site, n, r, include_wan=include_wan, include_ha=include_ha, json_only=json_only): n for n, r in targets}
+        for fut in as_completed(futs):
+            try:
+                # upserts stay on this thread; the sites.csv cache is not shared with the workers
+                upsert_sites_csv_row(fut.result())
+            except Exception as e:
+                fail += 1
+                print(f"ERROR: {futs[fut]}: {e}", file=sys.stderr)
+    print(f"Pulled {len(targets) - fail}/{len(targets)} sites; sites.csv: {CSV_PATH}")
+    return fail
+
+# ------------------------
+# Main
+# ------------------------
+def main():
+    ap = argparse.ArgumentParser(
+        description="List sites OR pull one by name; saves VLANs (JSON+CSV) and updates sites.csv"
+    )
+    ap.add_argument("--site-name", help="Human site name from the UI (e.g. 'Utrecht-Branch')")
+    ap.add_argument("--json-only", action="store_true", help="Skip writing VLAN CSV")
+    ap.add_argument("--include-wan", action="store_true", help="Include WAN VLANs in the CSV (default: excluded)")
+    ap.add_argument("--include-ha", action="store_true", help="Include HA internal VLAN(s) in the CSV (default: excluded)")
+    ap.add_argument("--list-templates", action="store_true", help="List templates (name, deployment_type, platform_type, id)")
+    ap.add_argument("--template-search", default="", help="Optional name filter for --list-templates (uses API 'search' param)")
+    ap.add_argument("--list-locations", action="store_true", help="List ZIA locations (name, id)")
+    ap.add_argument("--no-cache", action="store_true", help="Ignore the on-disk template/gateway cache (.cache/) for this run")
+    ap.add_argument("--all-sites", action="store_true", help="Pull every site in the tenant (VLANs + sites.csv rows)")
+    ap.add_argument("--workers", type=int, default=8, help="Sites pulled in parallel with --all-sites (default 8)")
+    args = ap.parse_args()
+
+    global CACHE_TTL_S
+    if args.no_cache:
+        CACHE_TTL_S = 0
+
+    # Handle location listing early-out
+    if args.list_locations:
+        locs = fetch_locations()
+        print_locations(locs)
+        return
+
+    # Handle template listing early-out
+    if args.list_templates:
+        tpls = fetch_templates(args.template_search)
+        print_templates(tpls)
+        return
+
+    if args.all_sites:
+        if pull_all_sites(workers=args.workers, include_wan=args.include_wan, include_ha=args.include_ha, json_only=args.json_only):
+            sys.exit(1)
+        return
+
+    # If no site name, list sites and exit
+    if not args.site_name:
+        print_site_list(list_gateways_rows())
+        return
+
+    # Always live (the row feeds sites.csv, so a cached copy could be stale);
+    # pages are streamed and fetching stops at the first match
+    names: Dict[str, Dict[str, Any]] = {}
+    row = match_row_by_name(iter_gateway_rows(), args.site_name, names)
+    if not row:
+        print(f"ERROR: site not found: {args.site_name}", file=sys.stderr)
+        close = difflib.get_close_matches(args.site_name.strip().lower(), list(names), n=3)
+        if close:
+            print(f"       Did you mean: {', '.join(close)}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        csv_row = pull_one_site(args.site_name, row, include_wan=args.include_wan, include_ha=args.include_ha, json_only=args.json_only)
+    except RuntimeError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
     upsert_sites_csv_row(csv_row)
     print(f"Upserted row in {CSV_PATH}: {csv_row}")
 
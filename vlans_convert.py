@@ -23,9 +23,21 @@
 #       otherwise                -> enabled = FALSE
 #   - default_gateway prefers start_ip, then default_gateway from JSON.
 
-import argparse, json, csv
+import argparse, json, csv, os
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+# Optional: orjson for faster JSON parsing (falls back to stdlib json)
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+# Optional: ijson to stream VLAN records from large JSON files (falls back to a full parse)
+try:
+    import ijson  # type: ignore
+except ImportError:
+    ijson = None
 
 def _as_bool(v: Any) -> bool:
     if isinstance(v, bool):
@@ -58,6 +70,8 @@ def parse_args():
 
 def read_json(path: Path) -> Any:
     try:
+        if orjson is not None:
+            return orjson.loads(path.read_bytes())
         return json.loads(path.read_text(encoding="utf-8"))
     except Exception as e:
         raise SystemExit(f"ERROR: failed to read/parse JSON {path}: {e}")
@@ -72,6 +86,32 @@ def normalize_rows(data: Any) -> List[Dict[str, Any]]:
         return data
     return []
 
+def iter_vlan_records(path: Path) -> Iterator[Dict[str, Any]]:
+    """VLAN dicts from a pulled JSON file, one at a time when ijson is installed."""
+    if ijson is None:
+        yield from normalize_rows(read_json(path))
+        return
+    try:
+        with path.open("rb") as f:
+            head = f.read(64).lstrip()
+            f.seek(0)
+            if head.startswith(b"["):
+                yield from ijson.items(f, "item", use_float=True)
+                return
+            # same shapes normalize_rows accepts: {"rows": [...]} or {"result": {"rows": [...]}};
+            # the first of those top-level keys picks the prefix, so the file is streamed only once more
+            prefix = None
+            for pfx, event, key in ijson.parse(f):
+                if pfx == "" and event == "map_key" and key in ("rows", "result"):
+                    prefix = "rows.item" if key == "rows" else "result.rows.item"
+                    break
+            if prefix is None:
+                return
+            f.seek(0)
+            yield from ijson.items(f, prefix, use_float=True)
+    except (OSError, ijson.JSONError) as e:
+        raise SystemExit(f"ERROR: failed to read/parse JSON {path}: {e}")
+
 def parse_dhcp_range(v: Any) -> Tuple[str,str]:
     if isinstance(v, str) and "-" in v:
         a, b = v.split("-", 1)
@@ -80,7 +120,14 @@ def parse_dhcp_range(v: Any) -> Tuple[str,str]:
         return str(v[0][0]), str(v[0][1])
     return "", ""
 
-def to_out_row(vlan: Dict[str, Any], include_id: bool) -> Dict[str, Any]:
+CSV_FIELDS = [
+    "tag","name","display_name","subnet","default_gateway",
+    "dhcp_start","dhcp_end","dhcp_service",
+    "interface","zone","enabled","share_over_vpn"
+]
+
+def to_out_row(vlan: Dict[str, Any], include_id: bool) -> List[Any]:
+    # list in CSV_FIELDS order (optionally led by vlan_id) for csv.writer
     # DHCP range (accept dhcp_range "a-b" or range_list [[a,b],...])
     dhcp_start, dhcp_end = parse_dhcp_range(vlan.get("dhcp_range") or vlan.get("range_list"))
 
@@ -94,35 +141,43 @@ def to_out_row(vlan: Dict[str, Any], include_id: bool) -> Dict[str, Any]:
     # enabled follows UI state (status)
     enabled = "TRUE" if vlan.get("status") == "provisioned" else "FALSE"
 
-    row = {
-        "tag":            str(vlan.get("tag", "")).strip(),
-        "name":           (vlan.get("name") or vlan.get("display_name") or "").strip(),
-        "display_name":   (vlan.get("display_name") or vlan.get("name") or "").strip(),
-        "subnet":         str(vlan.get("subnet", "")).strip(),
-        "default_gateway": (vlan.get("start_ip") or vlan.get("default_gateway") or "").strip(),
-        "dhcp_start":     dhcp_start,
-        "dhcp_end":       dhcp_end,
-        "dhcp_service":   display_service,   # <-- for the CSV we show "on"/"non_airgapped"/"no_dhcp"
-        "interface":      (vlan.get("interface") or "").strip(),
-        "zone":           (vlan.get("zone") or "").strip(),
-        "enabled":        enabled,
-        "share_over_vpn": "TRUE" if _as_bool(vlan.get("share_over_vpn")) else "FALSE",
-    }
+    row = [
+        str(vlan.get("tag", "")).strip(),
+        (vlan.get("name") or vlan.get("display_name") or "").strip(),
+        (vlan.get("display_name") or vlan.get("name") or "").strip(),
+        str(vlan.get("subnet", "")).strip(),
+        (vlan.get("start_ip") or vlan.get("default_gateway") or "").strip(),
+        dhcp_start,
+        dhcp_end,
+        display_service,   # <-- for the CSV we show "on"/"non_airgapped"/"no_dhcp"
+        (vlan.get("interface") or "").strip(),
+        (vlan.get("zone") or "").strip(),
+        enabled,
+        "TRUE" if _as_bool(vlan.get("share_over_vpn")) else "FALSE",
+    ]
     if include_id:
-        row = {"vlan_id": vlan.get("id", "")} | row
+        row.insert(0, vlan.get("id", ""))
     return row
 
-def write_csv(rows: List[Dict[str, Any]], path: Path, include_id: bool):
-    headers = (["vlan_id"] if include_id else []) + [
-        "tag","name","display_name","subnet","default_gateway",
-        "dhcp_start","dhcp_end","dhcp_service",
-        "interface","zone","enabled","share_over_vpn"
-    ]
+def write_csv(rows: Iterable[List[Any]], path: Path, include_id: bool) -> int:
+    # rows may be a generator; returns how many were written
+    headers = (["vlan_id"] if include_id else []) + CSV_FIELDS
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=headers)
-        w.writeheader()
-        w.writerows(rows)
+    # write a sibling .tmp and swap it in, so an interrupted run never leaves a truncated CSV
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    try:
+        with tmp.open("w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(headers)
+            n = 0
+            for row in rows:
+                w.writerow(row)
+                n += 1
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return n
 
 def main():
     a = parse_args()
@@ -133,9 +188,9 @@ def main():
         j = Path(a.from_json)
         c = Path(a.to_csv) if a.to_csv else j.with_suffix(".csv")
 
-    rows = [to_out_row(v, a.include_id) for v in normalize_rows(read_json(j))]
-    write_csv(rows, c, a.include_id)
-    print(f"Wrote {c} ({len(rows)} rows)")
+    rows = (to_out_row(v, a.include_id) for v in iter_vlan_records(j))
+    n = write_csv(rows, c, a.include_id)
+    print(f"Wrote {c} ({n} rows)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
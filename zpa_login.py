@@ -11,23 +11,38 @@ Compatible with the legacy API framework on api.zpatwo.net
 
 from __future__ import annotations
 import datetime as dt
+import functools
 import json
 import os
-import re
 import sys
-from pathlib import Path
 from typing import Optional, Tuple
 from urllib.parse import urlparse
 import requests
 
-# Optional: load from .env if present (non-fatal if missing)
+# .env writes share ztb_login's locked, atomic upsert: ZPA and ZTB logins run concurrently
+# (bulk_create site workers) against the same file
+from ztb_login import ENV_PATH, upsert_env_var, upsert_env_vars  # noqa: F401  (re-exported)
+
+# Optional: orjson for faster JSON parsing (falls back to stdlib json)
 try:
-    from dotenv import load_dotenv  # type: ignore
-    load_dotenv(override=False)
-except Exception:
-    pass
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+_ENV_LOADED = False
 
-ENV_PATH = Path(".env")
+
+def _ensure_env_loaded() -> None:
+    """Load .env via python-dotenv once per process (not at import; non-fatal if missing)."""
+    global _ENV_LOADED
+    if _ENV_LOADED:
+        return
+    try:
+        from dotenv import load_dotenv  # type: ignore
+        load_dotenv(override=False)
+    except Exception:
+        pass
+    _ENV_LOADED = True
 
 
 def get_env(name: str, *, required: bool = True) -> Optional[str]:
@@ -39,26 +54,13 @@ def get_env(name: str, *, required: bool = True) -> Optional[str]:
     return v
 
 
-def upsert_env_var(key: str, value: str) -> None:
-    """Upsert KEY="value" in .env (create file if missing)."""
-    text = ENV_PATH.read_text(encoding="utf-8") if ENV_PATH.exists() else ""
-    pattern = re.compile(rf"^{re.escape(key)}=.*$", re.MULTILINE)
-    line = f'{key}="{value}"'
-    if pattern.search(text):
-        text = pattern.sub(line, text)
-    else:
-        if text and not text.endswith("\n"):
-            text += "\n"
-        text += line + "\n"
-    ENV_PATH.write_text(text, encoding="utf-8")
-
-
 def compute_expiry_iso(seconds: int) -> str:
     """Return ISO 8601 UTC timestamp (Z format) given duration in seconds."""
     exp_dt = dt.datetime.now(dt.timezone.utc) + dt.timedelta(seconds=seconds)
     return exp_dt.isoformat().replace("+00:00", "Z")
 
 
+@functools.lru_cache(maxsize=4)
 def normalize_zpa_base_url(raw: str) -> str:
     """
     Normalize ZPA base input to a config host URL.
@@ -99,6 +101,7 @@ def zpa_login(write_env: bool = True, quiet: bool = False) -> Tuple[str, Optiona
     If write_env=True, updates .env with ZPA_BEARER and ZPA_BEARER_EXPIRES_AT.
     If quiet=True, suppresses console output.
     """
+    _ensure_env_loaded()
     raw_base = os.getenv("ZPA_BASE_URL", "")
     if not raw_base:
         raise SystemExit("❌ Missing ZPA_BASE_URL in .env")
@@ -120,7 +123,7 @@ def zpa_login(write_env: bool = True, quiet: bool = False) -> Tuple[str, Optiona
     payload = {"client_id": client_id, "client_secret": client_secret}
 
     try:
-        resp = requests.post(url, headers=headers, data=payload, timeout=30)
+        resp = requests.post(url, headers=headers, data=payload, timeout=(5, 30))
         resp.raise_for_status()
     except requests.HTTPError as e:
         try:
@@ -132,7 +135,7 @@ def zpa_login(write_env: bool = True, quiet: bool = False) -> Tuple[str, Optiona
         raise SystemExit(f"❌ Request error calling {url}: {e}") from e
 
     try:
-        data = resp.json()
+        data = orjson.loads(resp.content) if orjson is not None else resp.json()
         token = data.get("access_token") or resp.text.strip()
         expires_in = int(data.get("expires_in", 3600))
         iso_exp = compute_expiry_iso(expires_in)
@@ -140,9 +143,10 @@ def zpa_login(write_env: bool = True, quiet: bool = False) -> Tuple[str, Optiona
         raise SystemExit(f"❌ Unexpected JSON shape:\n{resp.text}")
 
     if write_env:
-        upsert_env_var("ZPA_BEARER", token)
+        updates = {"ZPA_BEARER": token}
         if iso_exp:
-            upsert_env_var("ZPA_BEARER_EXPIRES_AT", iso_exp)
+            updates["ZPA_BEARER_EXPIRES_AT"] = iso_exp
+        upsert_env_vars(updates)
 
     if not quiet:
         where = str(ENV_PATH.resolve()) if write_env else "(not written)"
@@ -8,11 +8,28 @@ zpa_provisioning.py
 
 import os
 import sys
+import re
 import json
+import socket
+import functools
+import time
+import threading
+import datetime as dt
 import requests
 import base64
-from typing import Dict, Any, Optional, Tuple
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple, Union
+from pathlib import Path
 from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+# Optional: orjson for faster JSON encode/decode (falls back to stdlib json)
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
 
 # Import zpa_login to ensure we can get a token
 try:
@@ -22,15 +39,87 @@ except ImportError:
     # If not, we might need to adjust sys.path or rely on env vars.
     pass
 
+# One keep-alive session for every ZPA (and geocoder) call: a site is 5+ requests to the same hosts.
+# Pool sized for bulk_create site workers sharing it across hosts.
+HTTP_POOL_CONNECTIONS = 8
+HTTP_POOL_MAXSIZE = 32
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter whose sockets enable TCP keepalive (on top of urllib3's TCP_NODELAY default),
+    so pooled connections idling between sites aren't silently dropped by NAT/firewalls."""
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault("socket_options", HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)])
+        super().init_poolmanager(*args, **kwargs)
+
+def _build_session() -> requests.Session:
+    s = requests.Session()
+    # Transient 429/5xx and connect/read errors on GETs are retried at the urllib3 layer with
+    # exponential backoff (honouring Retry-After); raise_on_status=False hands the last response
+    # back so callers still see the status code. POSTs create groups/keys and are never re-sent:
+    # a 5xx or read timeout after the server committed would duplicate them.
+    adapter = _KeepAliveAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        pool_block=False,
+        max_retries=Retry(
+            total=4,
+            connect=3,
+            read=3,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        ),
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+_ZPA_SESSION = _build_session()
+
+# (connect, read) seconds: fail fast on dead hosts, stay patient with slow list/create responses
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+GEO_TIMEOUT = (3, 5)
+
+@functools.lru_cache(maxsize=None)
+def _api_timeout() -> Tuple[float, float]:
+    """ZPA_CONNECT_TIMEOUT / ZPA_READ_TIMEOUT (env or .env), read once."""
+    zpa_login._ensure_env_loaded()
+    try:
+        return (float(os.getenv("ZPA_CONNECT_TIMEOUT") or DEFAULT_CONNECT_TIMEOUT),
+                float(os.getenv("ZPA_READ_TIMEOUT") or DEFAULT_READ_TIMEOUT))
+    except ValueError:
+        print("⚠️ Ignoring non-numeric ZPA_CONNECT_TIMEOUT/ZPA_READ_TIMEOUT", file=sys.stderr)
+        return DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+
+# pagesize for server-side name searches (search is a substring match, so allow a few hits)
+SEARCH_PAGE_SIZE = 20
+
+# (base_url, customer_id, lower-cased name) -> id; cert IDs are static for a run
+_CERT_ID_CACHE: Dict[Tuple[str, str, str], str] = {}
+
+def _dumps(obj: Any) -> Union[str, bytes]:
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj)
+
+def _loads(raw: Union[str, bytes]) -> Any:
+    # accepts response bytes directly; orjson.JSONDecodeError subclasses ValueError
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
 def get_zpa_headers(token: str) -> Dict[str, str]:
     return {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {token}"
     }
 
+_CUST_ID_RE = re.compile(rb'"custId"\s*:\s*"?([^",}\s]+)')
+
+@functools.lru_cache(maxsize=4)
 def get_customer_id(token: str) -> str:
     """
     Extracts the Customer ID (custId) from the JWT token.
+    Scans the decoded claims for the one field instead of json-parsing them.
     """
     try:
         parts = token.split(".")
@@ -41,51 +130,154 @@ def get_customer_id(token: str) -> str:
         if padding:
             payload += "=" * (4 - padding)
         decoded = base64.urlsafe_b64decode(payload)
-        claims = json.loads(decoded)
-        return str(claims.get("custId", ""))
+        m = _CUST_ID_RE.search(decoded)
+        return m.group(1).decode() if m else ""
     except Exception as e:
         print(f"❌ Failed to extract Customer ID from token: {e}", file=sys.stderr)
         return ""
 
+# One /signin per run: (token, expires_at epoch), reused until TOKEN_REFRESH_MARGIN_S before expiry
+TOKEN_REFRESH_MARGIN_S = 60
+_TOKEN_CACHE: Optional[Tuple[str, float]] = None
+_TOKEN_LOCK = threading.Lock()
+
+def _parse_expiry(iso_exp: Optional[str]) -> Optional[float]:
+    try:
+        return dt.datetime.fromisoformat((iso_exp or "").replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+def _token_is_valid() -> Optional[Tuple[str, float]]:
+    """(ZPA_BEARER, expires_at) from .env/environment if it outlives the refresh margin, else None."""
+    zpa_login._ensure_env_loaded()
+    token = (os.getenv("ZPA_BEARER") or "").strip()
+    expires_at = _parse_expiry(os.getenv("ZPA_BEARER_EXPIRES_AT"))
+    if token and expires_at and time.time() < expires_at - TOKEN_REFRESH_MARGIN_S:
+        return token, expires_at
+    return None
+
+def _get_cached_token() -> Tuple[str, float]:
+    """
+    Returns (token, expires_at), logging in only when neither the in-memory
+    token nor the one saved in .env by a previous run is still valid.
+    """
+    global _TOKEN_CACHE
+    with _TOKEN_LOCK:
+        if _TOKEN_CACHE and time.time() < _TOKEN_CACHE[1] - TOKEN_REFRESH_MARGIN_S:
+            return _TOKEN_CACHE
+        # env only on first use: after that it holds the same (or an older) token
+        saved = _token_is_valid() if _TOKEN_CACHE is None else None
+        if saved:
+            _TOKEN_CACHE = saved
+            return _TOKEN_CACHE
+        # one login (and one .env write) per run; site workers share the in-memory token
+        token, iso_exp = zpa_login.zpa_login(write_env=True, quiet=True)
+        _TOKEN_CACHE = (token, _parse_expiry(iso_exp) or time.time() + 3600)
+        return _TOKEN_CACHE
+
+# base_url -> "v2" | "v1": the mgmtconfig version that answered; tried first so later lookups skip the 404 probe
+_API_VERSION: Dict[str, str] = {}
+
+@dataclass(frozen=True)
+class ZpaTenantEndpoints:
+    """mgmtconfig URLs for one (base_url, customer_id), built once per run."""
+    cert_v2: str
+    cert_v1: str
+    group_v2: str
+    group_v1: str
+    provisioning_key: str
+
+@functools.lru_cache(maxsize=8)
+def tenant_endpoints(base_url: str, customer_id: str) -> ZpaTenantEndpoints:
+    v2 = f"{base_url}/mgmtconfig/v2/admin/customers/{customer_id}"
+    v1 = f"{base_url}/mgmtconfig/v1/admin/customers/{customer_id}"
+    return ZpaTenantEndpoints(
+        cert_v2=f"{v2}/enrollmentCert",
+        cert_v1=f"{v1}/enrollmentCert",
+        group_v2=f"{v2}/appConnectorGroup",
+        group_v1=f"{v1}/appConnectorGroup",
+        provisioning_key=f"{v1}/associationType/CONNECTOR_GRP/provisioningKey",
+    )
+
+def _mgmtconfig_urls(base_url: str, v2_url: str, v1_url: str) -> List[Tuple[str, str]]:
+    if _API_VERSION.get(base_url) == "v1":
+        return [("v1", v1_url), ("v2", v2_url)]
+    return [("v2", v2_url), ("v1", v1_url)]
+
+def _use_token(token: str) -> None:
+    """Put the ZPA auth headers on the shared session (only rebuilt when the token changes)."""
+    if _ZPA_SESSION.headers.get("Authorization") != f"Bearer {token}":
+        _ZPA_SESSION.headers.update(get_zpa_headers(token))
+
 def get_enrollment_cert_id(base_url: str, customer_id: str, token: str, cert_name: str = "Connector") -> Optional[str]:
     """
     Fetches the enrollment certificate ID by name.
     Default is "Connector" which is the standard signing certificate.
+    Successful lookups are cached per tenant for the rest of the run.
     """
-    # Try v2 endpoint first, then v1
-    endpoints = [
-        f"{base_url}/mgmtconfig/v2/admin/customers/{customer_id}/enrollmentCert",
-        f"{base_url}/mgmtconfig/v1/admin/customers/{customer_id}/enrollmentCert",
-    ]
+    key = (base_url, customer_id, cert_name.lower())
+    cert_id = _CERT_ID_CACHE.get(key)
+    if cert_id is None:
+        cert_id = _fetch_enrollment_cert_id(base_url, customer_id, token, cert_name)
+        if cert_id:
+            _CERT_ID_CACHE[key] = cert_id
+    return cert_id
+
+def _get_list(url: str, params: Optional[Dict[str, Any]] = None) -> Optional[List[Dict[str, Any]]]:
+    """GET a mgmtconfig list endpoint; None on 404 (version not served) or an unexpected shape.
+    A non-404 4xx on a filtered GET (search/pagesize rejected) is retried unfiltered."""
+    resp = _ZPA_SESSION.get(url, params=params, timeout=_api_timeout())
+    if resp.status_code == 404:
+        return None
+    if params and 400 <= resp.status_code < 500:
+        return _get_list(url)
+    resp.raise_for_status()
+    data = _loads(resp.content)
+    # ZPA omits "list" when a (filtered) page is empty
+    rows = (data.get("list") or []) if isinstance(data, dict) else data
+    return rows if isinstance(rows, list) else None
+
+def _find_by_name(rows: List[Dict[str, Any]], name: str) -> Optional[Dict[str, Any]]:
+    name = name.lower()
+    for row in rows:
+        if row.get("name", "").lower() == name:
+            return row
+    return None
+
+def _fetch_enrollment_cert_id(base_url: str, customer_id: str, token: str, cert_name: str) -> Optional[str]:
+    # Try v2 endpoint first, then v1 (or whichever version this tenant answered on before)
+    ep = tenant_endpoints(base_url, customer_id)
+    endpoints = _mgmtconfig_urls(base_url, ep.cert_v2, ep.cert_v1)
     
-    headers = get_zpa_headers(token)
+    _use_token(token)
     
-    for url in endpoints:
+    for version, url in endpoints:
         try:
-            resp = requests.get(url, headers=headers, timeout=30)
-            if resp.status_code == 404:
-                continue
-            resp.raise_for_status()
-            
-            data = resp.json()
-            certs = data.get("list", []) or data
-            
-            if not isinstance(certs, list):
+            # Let the server filter by name: one small page instead of every cert
+            certs = _get_list(url, {"search": cert_name, "pagesize": SEARCH_PAGE_SIZE})
+            if certs is None:
                 continue
+            _API_VERSION[base_url] = version
             
             # Look for the certificate by name
-            for cert in certs:
-                if cert.get("name", "").lower() == cert_name.lower():
-                    return cert.get("id")
+            cert = _find_by_name(certs, cert_name)
+            if cert:
+                return cert.get("id")
+            
+            # Not in the filtered page: the full list decides the fallback
+            certs = _get_list(url) or []
+            cert = _find_by_name(certs, cert_name)
+            if cert:
+                return cert.get("id")
             
             # If not found, return the first one as fallback
             if certs:
                 print(f"   ⚠️  Certificate '{cert_name}' not found, using: {certs[0].get('name')}", file=sys.stderr)
                 return certs[0].get("id")
             
-        except Exception as e:
-            if "404" not in str(e):
-                print(f"   ⚠️  Error fetching from {url}: {e}", file=sys.stderr)
+        except (requests.RequestException, ValueError) as e:
+            # transient 429/5xx/connect errors were already retried by the session adapter
+            print(f"   ⚠️  Error fetching from {url}: {e}", file=sys.stderr)
             continue
     
     print(f"   ⚠️  Failed to fetch enrollment certificates from all endpoints", file=sys.stderr)
@@ -96,79 +288,115 @@ def get_app_connector_group_id(base_url: str, customer_id: str, token: str, grou
     Fetches the App Connector Group ID by name.
     If no group_name is provided, returns the first available group.
     """
-    # Try v2 endpoint first, then v1
-    endpoints = [
-        f"{base_url}/mgmtconfig/v2/admin/customers/{customer_id}/appConnectorGroup",
-        f"{base_url}/mgmtconfig/v1/admin/customers/{customer_id}/appConnectorGroup",
-    ]
+    # Try v2 endpoint first, then v1 (or whichever version this tenant answered on before)
+    ep = tenant_endpoints(base_url, customer_id)
+    endpoints = _mgmtconfig_urls(base_url, ep.group_v2, ep.group_v1)
     
-    headers = get_zpa_headers(token)
+    _use_token(token)
     
-    for url in endpoints:
+    for version, url in endpoints:
         try:
-            resp = requests.get(url, headers=headers, timeout=30)
-            if resp.status_code == 404:
+            # With a name, let the server filter first; without one, a single row is enough
+            params = {"search": group_name, "pagesize": SEARCH_PAGE_SIZE} if group_name else {"pagesize": 1}
+            groups = _get_list(url, params)
+            if groups is None:
                 continue
-            resp.raise_for_status()
+            _API_VERSION[base_url] = version
             
-            data = resp.json()
-            groups = data.get("list", []) or data
-            
-            if not isinstance(groups, list):
-                continue
+            # If group_name is specified, look for it
+            if group_name:
+                group = _find_by_name(groups, group_name)
+                if group:
+                    return group.get("id")
+                # Not in the filtered page: the full list decides the fallback
+                groups = _get_list(url) or []
+                group = _find_by_name(groups, group_name)
+                if group:
+                    return group.get("id")
+                if groups:
+                    print(f"   ⚠️  App Connector Group '{group_name}' not found, using: {groups[0].get('name')}", file=sys.stderr)
             
             if not groups:
                 print(f"   ⚠️  No App Connector Groups found", file=sys.stderr)
                 return None
             
-            # If group_name is specified, look for it
-            if group_name:
-                for group in groups:
-                    if group.get("name", "").lower() == group_name.lower():
-                        return group.get("id")
-                print(f"   ⚠️  App Connector Group '{group_name}' not found, using: {groups[0].get('name')}", file=sys.stderr)
-            
             # Return the first group as fallback
             return groups[0].get("id")
             
-        except Exception as e:
-            if "404" not in str(e):
-                print(f"   ⚠️  Error fetching from {url}: {e}", file=sys.stderr)
+        except (requests.RequestException, ValueError) as e:
+            # transient 429/5xx/connect errors were already retried by the session adapter
+            print(f"   ⚠️  Error fetching from {url}: {e}", file=sys.stderr)
             continue
     
     print(f"   ⚠️  Failed to fetch App Connector Groups from all endpoints", file=sys.stderr)
     return None
 
+# "city|country" -> [lat, lon]; persisted next to .env so repeat cities skip Nominatim (1 req/s limit)
+GEO_CACHE_PATH = Path(".geo_cache.json")
+_GEO_CACHE: Optional[Dict[str, List[str]]] = None
+_GEO_LOCK = threading.Lock()
+
+def _geo_cache() -> Dict[str, List[str]]:
+    global _GEO_CACHE
+    if _GEO_CACHE is None:
+        try:
+            _GEO_CACHE = json.loads(GEO_CACHE_PATH.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            _GEO_CACHE = {}
+    return _GEO_CACHE
+
+def _geo_cache_store(key: str, lat: str, lon: str) -> None:
+    cache = _geo_cache()
+    cache[key] = [lat, lon]
+    tmp = GEO_CACHE_PATH.with_suffix(".json.tmp")
+    try:
+        tmp.write_text(json.dumps(cache, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, GEO_CACHE_PATH)
+    except OSError as e:
+        print(f"   ⚠️  Could not write {GEO_CACHE_PATH}: {e}", file=sys.stderr)
+
 def get_geo_location(city: str, country: str) -> Tuple[str, str]:
     """
     Get latitude and longitude for a city/country.
     Returns (lat, long) as strings. Default to "0.0", "0.0" on failure.
+    Found locations are cached in memory and in .geo_cache.json; misses are not.
     """
     if not city:
         return "0.0", "0.0"
-        
-    try:
-        # Use OpenStreetMap Nominatim API (no key required for low volume)
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            "q": f"{city}, {country}",
-            "format": "json",
-            "limit": 1
-        }
-        headers = {"User-Agent": "ztb-automation-script"}
-        resp = requests.get(url, params=params, headers=headers, timeout=5)
-        if resp.status_code == 200:
-            data = resp.json()
-            if data:
-                return str(data[0].get("lat", "0.0")), str(data[0].get("lon", "0.0"))
-    except Exception as e:
-        print(f"   ⚠️  Geocoding failed for {city}, {country}: {e}", file=sys.stderr)
+
+    key = f"{city.strip().lower()}|{country.strip().lower()}"
+    # lock held across the lookup: concurrent sites in one city wait for a single query
+    with _GEO_LOCK:
+        hit = _geo_cache().get(key)
+        if hit and hit != ["0.0", "0.0"]:  # older runs cached misses as 0.0/0.0; re-query those
+            return hit[0], hit[1]
+        try:
+            # Use OpenStreetMap Nominatim API (no key required for low volume)
+            url = "https://nominatim.openstreetmap.org/search"
+            params = {
+                "q": f"{city}, {country}",
+                "format": "json",
+                "limit": 1
+            }
+            # never forward the ZPA bearer to a third-party host
+            headers = {"User-Agent": "ztb-automation-script", "Authorization": None}
+            resp = _ZPA_SESSION.get(url, params=params, headers=headers, timeout=GEO_TIMEOUT)
+            if resp.status_code == 200:
+                data = _loads(resp.content)
+                if data:
+                    lat, lon = str(data[0].get("lat", "0.0")), str(data[0].get("lon", "0.0"))
+                    _geo_cache_store(key, lat, lon)
+                    return lat, lon
+                # no match (e.g. a typo'd city): not cached, so a corrected row is looked up again
+        except Exception as e:
+            print(f"   ⚠️  Geocoding failed for {city}, {country}: {e}", file=sys.stderr)
     
     return "0.0", "0.0"
 
 
 
 
+@functools.lru_cache(maxsize=4)
 def _normalize_zpa_base_url(raw: str) -> str:
     """
     Normalize env input to a config host URL.
@@ -193,6 +421,27 @@ def _normalize_zpa_base_url(raw: str) -> str:
     scheme = parsed.scheme or "https"
     return f"{scheme}://{host}"
 
+def _log_api_error(op: str, e: Exception) -> None:
+    print(f"❌ Failed to {op}: {e}", file=sys.stderr)
+    # only HTTP errors carry a server response worth showing (4xx responses are falsy, so test for None)
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        print(f"   Response: {e.response.text[:800]}", file=sys.stderr)
+
+# Country name / alias (lower-cased) -> ISO 3166 alpha-2 code for App Connector Groups
+_COUNTRY_CODE = {
+    "united states": "US", "usa": "US", "us": "US",
+    "united kingdom": "GB", "uk": "GB", "gb": "GB",
+    "germany": "DE", "de": "DE",
+    "france": "FR", "fr": "FR",
+    "australia": "AU", "au": "AU",
+    "canada": "CA", "ca": "CA",
+    "india": "IN", "in": "IN",
+    "japan": "JP", "jp": "JP",
+    "singapore": "SG", "sg": "SG",
+    "switzerland": "CH", "ch": "CH",
+    "netherlands": "NL", "nl": "NL",
+}
+
 def create_app_connector_group(base_url: str, customer_id: str, token: str, name: str, city: str, country: str, dry_run: bool = False) -> Optional[str]:
     """
     Creates an App Connector Group using the standard mgmtconfig endpoint.
@@ -204,25 +453,14 @@ def create_app_connector_group(base_url: str, customer_id: str, token: str, name
 
     # Use mgmtconfig endpoint (usually on config.<cloud>)
     # standard base_url from _normalize_zpa_base_url is already config.<cloud>
-    url = f"{base_url}/mgmtconfig/v1/admin/customers/{customer_id}/appConnectorGroup"
-    headers = get_zpa_headers(token)
+    url = tenant_endpoints(base_url, customer_id).group_v1
+    _use_token(token)
     
     lat, lon = get_geo_location(city, country)
     location_str = f"{city}, {country}" if city and country else (city or country or "Unknown")
     
-    # Map country to Code if possible
-    country_code = "NL" # generic default from original code
-    c_lower = country.lower()
-    if c_lower in ("united states", "usa", "us"): country_code = "US"
-    elif c_lower in ("united kingdom", "uk", "gb"): country_code = "GB"
-    elif c_lower in ("germany", "de"): country_code = "DE"
-    elif c_lower in ("france", "fr"): country_code = "FR"
-    elif c_lower in ("australia", "au"): country_code = "AU"
-    elif c_lower in ("canada", "ca"): country_code = "CA"
-    elif c_lower in ("india", "in"): country_code = "IN"
-    elif c_lower in ("japan", "jp"): country_code = "JP"
-    elif c_lower in ("singapore", "sg"): country_code = "SG"
-    elif c_lower in ("switzerland", "ch"): country_code = "CH"
+    # Map country to Code if possible ("NL" is the generic default from original code)
+    country_code = _COUNTRY_CODE.get(country.strip().lower(), "NL")
 
     payload = {
         "name": name,
@@ -243,15 +481,13 @@ def create_app_connector_group(base_url: str, customer_id: str, token: str, name
     }
     
     try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=30)
+        resp = _ZPA_SESSION.post(url, data=_dumps(payload), timeout=_api_timeout())
         resp.raise_for_status()
-        data = resp.json()
+        data = _loads(resp.content)
         print(f"   ✅ Created App Connector Group: {name} ({location_str})")
         return str(data.get("id"))
-    except Exception as e:
-        print(f"❌ Failed to create App Connector Group: {e}", file=sys.stderr)
-        if hasattr(e, 'response') and e.response:
-             print(f"   Response: {e.response.text}", file=sys.stderr)
+    except (requests.RequestException, ValueError) as e:
+        _log_api_error("create App Connector Group", e)
         return None
 
 def create_provisioning_key(base_url: str, customer_id: str, token: str, name: str, group_id: str, enrollment_cert_id: str, max_usage: int = 2, dry_run: bool = False) -> str:
@@ -264,8 +500,8 @@ def create_provisioning_key(base_url: str, customer_id: str, token: str, name: s
         return "dry-run-key-12345"
 
     # Use mgmtconfig endpoint
-    url = f"{base_url}/mgmtconfig/v1/admin/customers/{customer_id}/associationType/CONNECTOR_GRP/provisioningKey"
-    headers = get_zpa_headers(token)
+    url = tenant_endpoints(base_url, customer_id).provisioning_key
+    _use_token(token)
     
     payload = {
         "name": name,
@@ -276,9 +512,9 @@ def create_provisioning_key(base_url: str, customer_id: str, token: str, name: s
     }
     
     try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=30)
+        resp = _ZPA_SESSION.post(url, data=_dumps(payload), timeout=_api_timeout())
         resp.raise_for_status()
-        data = resp.json()
+        data = _loads(resp.content)
         
         # The key is usually in 'provisioningKey' or simply returned as the key string in some versions,
         # but standard API returns an object with 'key' or 'provisioningKey'.
@@ -293,10 +529,8 @@ def create_provisioning_key(base_url: str, customer_id: str, token: str, name: s
             print(f"❌ Provisioning key not found in response: {data.keys()}", file=sys.stderr)
             return ""
             
-    except Exception as e:
-        print(f"❌ Failed to create ZPA Provisioning Key: {e}", file=sys.stderr)
-        if hasattr(e, 'response') and e.response:
-             print(f"   Response: {e.response.text}", file=sys.stderr)
+    except (requests.RequestException, ValueError) as e:
+        _log_api_error("create ZPA Provisioning Key", e)
         return ""
 
 def update_ztb_site_zpa(ztb_session: requests.Session, ztb_api_base: str, cluster_id: int, name: str, provisioning_key: str, dry_run: bool = False) -> bool:
@@ -317,7 +551,7 @@ def update_ztb_site_zpa(ztb_session: requests.Session, ztb_api_base: str, cluste
     }
     
     try:
-        resp = ztb_session.post(url, params=params, json=payload, timeout=30)
+        resp = ztb_session.post(url, params=params, data=_dumps(payload), headers={"Content-Type": "application/json"}, timeout=_api_timeout())
         if resp.status_code in (200, 201, 204):
             print(f"✅ Updated ZTB Cluster {cluster_id} with ZPA Key")
             return True
@@ -328,25 +562,18 @@ def update_ztb_site_zpa(ztb_session: requests.Session, ztb_api_base: str, cluste
         print(f"❌ Error updating ZTB Cluster: {e}", file=sys.stderr)
         return False
 
-def provision_zpa_for_site(row: Dict[str, str], ztb_session: requests.Session, ztb_api_base: str, cluster_id: int, dry_run: bool = False) -> bool:
+def _zpa_run_context() -> Optional[Tuple[str, str, str]]:
     """
-    Main orchestrator function for a single site row.
+    Login + tenant lookups shared by every site in a run.
+    Returns (token, zpa_base, customer_id), or None after printing why.
     """
-    site_name = row.get("site_name")
-    if not site_name:
-        print("⚠️ Skipping ZPA provisioning: No site_name", file=sys.stderr)
-        return False
-
-    print(f"🚀 Starting ZPA Provisioning for {site_name}...")
-
-    # 1. Get ZPA Token
-    # We assume zpa_login can be called or we have env vars.
-    # Let's try to refresh/get token using zpa_login logic
+    # 1. Get ZPA Token (cached across sites; zpa_login only runs on first use or near expiry)
     try:
-        token, _ = zpa_login.zpa_login(write_env=True, quiet=True)
-    except Exception as e:
+        token, _ = _get_cached_token()
+    except (Exception, SystemExit) as e:
         print(f"❌ ZPA Login failed: {e}", file=sys.stderr)
-        return False
+        return None
+    _use_token(token)
 
     zpa_base = _normalize_zpa_base_url(os.getenv("ZPA_BASE_URL", ""))
     if not zpa_base:
@@ -355,12 +582,18 @@ def provision_zpa_for_site(row: Dict[str, str], ztb_session: requests.Session, z
             "(expected e.g. 'https://config.private.zscaler.com' or 'private.zscaler.com')",
             file=sys.stderr,
         )
-        return False
+        return None
 
     # 2. Get Customer ID
     customer_id = get_customer_id(token)
     if not customer_id:
-        return False
+        return None
+    return token, zpa_base, customer_id
+
+def _provision_site(row: Dict[str, str], ztb_session: requests.Session, ztb_api_base: str, cluster_id: int,
+                    ctx: Tuple[str, str, str], dry_run: bool = False) -> bool:
+    site_name = row.get("site_name")
+    token, zpa_base, customer_id = ctx
 
     # 3. Get Enrollment Cert ID
     cert_name = os.getenv("ZPA_ENROLLMENT_CERT_NAME", "Connector")
@@ -393,3 +626,19 @@ def provision_zpa_for_site(row: Dict[str, str], ztb_session: requests.Session, z
 
     # 6. Update ZTB (No need to look up site_id anymore, we use cluster_id passed in)
     return update_ztb_site_zpa(ztb_session, ztb_api_base, cluster_id, site_name, prov_key, dry_run=dry_run)
+
+def provision_zpa_for_site(row: Dict[str, str], ztb_session: requests.Session, ztb_api_base: str, cluster_id: int, dry_run: bool = False) -> bool:
+    """
+    Main orchestrator function for a single site row.
+    """
+    site_name = row.get("site_name")
+    if not site_name:
+        print("⚠️ Skipping ZPA provisioning: No site_name", file=sys.stderr)
+        return False
+
+    print(f"🚀 Starting ZPA Provisioning for {site_name}...")
+
+    ctx = _zpa_run_context()
+    if not ctx:
+        return False
+    return _provision_site(row, ztb_session, ztb_api_base, cluster_id, ctx, dry_run=dry_run)
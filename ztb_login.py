@@ -12,49 +12,164 @@ Supports both:
 """
 
 from __future__ import annotations
+import contextlib
 import datetime as dt
+import functools
 import json
 import os
-import re
 import sys
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Optional: load from .env if present (non-fatal if missing)
+# File locking for .env updates: fcntl on POSIX, msvcrt on Windows
 try:
-    from dotenv import load_dotenv  # type: ignore
-    load_dotenv(override=False)
-except Exception:
-    pass
+    import fcntl
+except ImportError:
+    fcntl = None  # type: ignore
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None  # type: ignore
+
+# Optional: orjson for faster JSON parsing (falls back to stdlib json)
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
 
 ENV_PATH = Path(".env")
+LOGIN_PATH = "/api/v3/api-key-auth/login"
+_UTC = dt.timezone.utc
+
+# Reused across ztb_login() calls (token refreshes) so later logins skip the TCP+TLS handshake
+_SESSION = requests.Session()
+_SESSION.headers["Content-Type"] = "application/json"
+# Login is safe to repeat, so POST is retried on gateway errors too; raise_on_status=False
+# hands the last response back to the HTTPError formatter below.
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["POST"]),
+        raise_on_status=False,
+    ),
+)
+_SESSION.mount("https://", _adapter)
+_SESSION.mount("http://", _adapter)
+
+
+def _loads(raw: bytes) -> Any:
+    # straight from response bytes; orjson.JSONDecodeError subclasses ValueError
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _pretty(obj: Any) -> str:
+    # indented JSON for error messages (obj is already decoded; never re-parse the response)
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2, ensure_ascii=False)
+
+
+def _body_excerpt(resp: requests.Response, limit: int = 800) -> str:
+    # decode only the head of a (possibly huge HTML) error body instead of all of resp.text
+    head = (resp.content or b"")[: limit * 4]  # utf-8 is at most 4 bytes per char
+    try:
+        return head.decode(resp.encoding or "utf-8", errors="replace")[:limit]
+    except LookupError:  # unknown charset in Content-Type
+        return head.decode("utf-8", errors="replace")[:limit]
+
+
+# Variables this module reads; snapshotted once so repeat logins skip .env parsing and env lookups
+_ENV_KEYS = ("ZTB_API_BASE", "ZIA_API_BASE", "API_KEY", "BEARER", "BEARER_EXPIRES_AT")
+
+
+@functools.lru_cache(maxsize=1)
+def _load_env_snapshot() -> Dict[str, Optional[str]]:
+    """Load .env once (non-fatal if python-dotenv or the file is missing) and snapshot _ENV_KEYS."""
+    try:
+        from dotenv import load_dotenv  # type: ignore
+        load_dotenv(override=False)
+    except Exception:
+        pass
+    return {k: os.environ.get(k) for k in _ENV_KEYS}
 
 
 def get_env(name: str, *, required: bool = True) -> Optional[str]:
-    """Fetch env var, optionally requiring it."""
-    v = os.getenv(name)
+    """Fetch env var (snapshot first, then the live environment), optionally requiring it."""
+    v = _load_env_snapshot().get(name) or os.getenv(name)
     if required and not v:
         print(f"❌ Missing {name} (set it in .env or your environment)", file=sys.stderr)
         sys.exit(2)
     return v
 
 
+@contextlib.contextmanager
+def _env_lock():
+    """
+    Exclusive cross-process lock for .env read-modify-write (e.g. parallel CI jobs).
+    Locks a sibling .env.lock: .env itself is swapped by os.replace, so its inode can't carry the lock.
+    """
+    lock_path = ENV_PATH.with_name(ENV_PATH.name + ".lock")
+    with open(lock_path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def upsert_env_vars(updates: Dict[str, str]) -> None:
+    """Upsert KEY="value" lines in .env with one read and one atomic write (create file if missing)."""
+    with _env_lock():
+        _upsert_env_vars_locked(updates)
+
+
+def _upsert_env_vars_locked(updates: Dict[str, str]) -> None:
+    text = ENV_PATH.read_text(encoding="utf-8") if ENV_PATH.exists() else ""
+    lines = text.split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()  # trailing newline
+    pending = dict(updates)
+    for i, line in enumerate(lines):
+        # plain str ops, no regex: KEY is whatever precedes the first "="
+        key, sep, _ = line.partition("=")
+        if sep and key in updates:
+            lines[i] = f'{key}="{updates[key]}"'
+            pending.pop(key, None)
+    lines.extend(f'{k}="{v}"' for k, v in pending.items())
+    new_text = "\n".join(lines) + "\n"
+    if new_text == text:
+        return  # values already on disk
+    # temp file + os.replace: a crash mid-write never leaves a truncated .env
+    tmp = ENV_PATH.with_name(ENV_PATH.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(new_text.encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ENV_PATH)
+
+
 def upsert_env_var(key: str, value: str) -> None:
     """Upsert KEY="value" in .env (create file if missing)."""
-    text = ENV_PATH.read_text(encoding="utf-8") if ENV_PATH.exists() else ""
-    pattern = re.compile(rf"^{re.escape(key)}=.*$", re.MULTILINE)
-    line = f'{key}="{value}"'
-    if pattern.search(text):
-        text = pattern.sub(line, text)
-    else:
-        if text and not text.endswith("\n"):
-            text += "\n"
-        text += line + "\n"
-    ENV_PATH.write_text(text, encoding="utf-8")
+    upsert_env_vars({key: value})
 
 
+@functools.lru_cache(maxsize=4)
 def normalize_base(raw: str) -> str:
     """
     Normalize ZTB API base:
@@ -73,29 +188,29 @@ def parse_expiry_fields(result: dict) -> Tuple[Optional[str], Optional[int]]:
     Returns: (iso_expiry_str, seconds_remaining)
     """
     iso, seconds = None, None
+    now = dt.datetime.now(_UTC)  # one clock read for both branches
 
     if isinstance(result.get("expires_at"), str):
         iso = result["expires_at"]
         try:
             s = result["expires_at"]
             if s.endswith("Z"):
-                exp_dt = dt.datetime.fromisoformat(s.replace("Z", "+00:00"))
+                exp_dt = dt.datetime.fromisoformat(s[:-1] + "+00:00")
             else:
                 exp_dt = dt.datetime.fromisoformat(s)
                 if exp_dt.tzinfo is None:
-                    exp_dt = exp_dt.replace(tzinfo=dt.timezone.utc)
-            now = dt.datetime.now(dt.timezone.utc)
+                    exp_dt = exp_dt.replace(tzinfo=_UTC)
             seconds = int(max(0, (exp_dt - now).total_seconds()))
         except Exception:
             pass
 
-    for k in ("expires_in", "ttl", "ttl_seconds"):
-        if isinstance(result.get(k), (int, float)):
-            seconds = int(result[k])
-            if iso is None:
-                exp_dt = dt.datetime.now(dt.timezone.utc) + dt.timedelta(seconds=seconds)
-                iso = exp_dt.isoformat().replace("+00:00", "Z")
-            break
+    # first numeric TTL field wins
+    ttl = next((result[k] for k in ("expires_in", "ttl", "ttl_seconds") if isinstance(result.get(k), (int, float))), None)
+    if ttl is not None:
+        seconds = int(ttl)
+        if iso is None:
+            exp_dt = now + dt.timedelta(seconds=seconds)
+            iso = exp_dt.strftime("%Y-%m-%dT%H:%M:%SZ")  # UTC by construction
 
     return iso, seconds
 
@@ -107,55 +222,64 @@ def ztb_login(write_env: bool = True, quiet: bool = False) -> Tuple[str, Optiona
     If write_env=True, updates .env with BEARER and BEARER_EXPIRES_AT.
     If quiet=True, suppresses console output.
     """
-    base_raw = (os.getenv("ZTB_API_BASE") or os.getenv("ZIA_API_BASE") or "").strip()
+    env = _load_env_snapshot()
+    base_raw = (env["ZTB_API_BASE"] or env["ZIA_API_BASE"] or "").strip()
     if not base_raw:
         raise SystemExit("❌ Missing ZTB_API_BASE (or legacy ZIA_API_BASE). Set it in .env")
     api_key = get_env("API_KEY")
 
     base = normalize_base(base_raw)
-    url = f"{base}/api/v3/api-key-auth/login"
+    url = base + LOGIN_PATH
 
     try:
-        resp = requests.post(
+        resp = _SESSION.post(
             url,
-            headers={"Content-Type": "application/json"},
             json={"api_key": api_key},
             timeout=30,
         )
         resp.raise_for_status()
     except requests.HTTPError as e:
         try:
-            body = json.dumps(resp.json(), indent=2)
-        except Exception:
-            body = (getattr(resp, "text", "") or "")[:800]
+            body = _pretty(_loads(resp.content))
+        except ValueError:
+            body = _body_excerpt(resp)
         raise SystemExit(f"❌ Auth failed ({resp.status_code}) at {url}\nResponse:\n{body}") from e
     except Exception as e:
         raise SystemExit(f"❌ Request error calling {url}: {e}") from e
 
+    # parse once; the error message below reuses the decoded body
+    try:
+        data = _loads(resp.content)
+    except ValueError:
+        raise SystemExit(f"❌ Unexpected (non-JSON) response:\n{_body_excerpt(resp)}")
     try:
-        data = resp.json()
         result = data["result"]
         token = result["delegate_token"]
         if not token:
             raise KeyError("empty token")
     except Exception:
-        raise SystemExit(f"❌ Unexpected JSON shape:\n{json.dumps(resp.json(), indent=2)}")
+        raise SystemExit(f"❌ Unexpected JSON shape:\n{_pretty(data)}")
 
     iso_exp, seconds = parse_expiry_fields(result)
 
     if write_env:
-        upsert_env_var("BEARER", token)
+        updates = {"BEARER": token}
         if iso_exp:
-            upsert_env_var("BEARER_EXPIRES_AT", iso_exp)
+            updates["BEARER_EXPIRES_AT"] = iso_exp
+        upsert_env_vars(updates)
 
     if not quiet:
         where = str(ENV_PATH.resolve()) if write_env else "(not written)"
-        print(f"✅ ZTB token retrieved")
-        print(f"   • API base  : {base}")
-        print(f"   • .env file : {where}")
+        lines = [
+            "✅ ZTB token retrieved",
+            f"   • API base  : {base}",
+            f"   • .env file : {where}",
+        ]
         if iso_exp or seconds is not None:
             human = f"{seconds//3600}h{(seconds%3600)//60:02d}m" if seconds is not None else "unknown"
-            print(f"   • Expires   : {iso_exp or 'unknown'} (~{human})")
+            lines.append(f"   • Expires   : {iso_exp or 'unknown'} (~{human})")
+        # one write for the whole status block
+        sys.stdout.write("\n".join(lines) + "\n")
 
     return token, iso_exp
 